@@ -0,0 +1,109 @@
+"""
+常驻对齐服务的客户端
+"""
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import uuid
+
+DEFAULT_SERVER_URL = os.environ.get("ALIGNER_SERVER_URL", "http://127.0.0.1:8765")
+
+
+class AlignerServerError(RuntimeError):
+    """对齐服务返回错误"""
+
+
+def server_health(server_url: str = DEFAULT_SERVER_URL, timeout: float = 0.5):
+    """读取对齐服务的状态（模型与推理配置），服务未运行时返回 None"""
+    try:
+        with urllib.request.urlopen(f"{server_url}/health", timeout=timeout) as resp:
+            if resp.status != 200:
+                return None
+            return json.loads(resp.read().decode("utf-8"))
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def server_available(server_url: str = DEFAULT_SERVER_URL, timeout: float = 0.5):
+    """检查对齐服务是否在运行"""
+    return server_health(server_url, timeout) is not None
+
+
+def poll_progress(server_url, job_id, callback, stop, interval, last):
+    """定期查询任务进度，有变化时调用 callback；last[0] 保存最近一次的进度"""
+    while not stop.wait(interval):
+        try:
+            with urllib.request.urlopen(
+                f"{server_url}/progress/{job_id}", timeout=max(interval, 1.0)
+            ) as resp:
+                progress = json.loads(resp.read().decode("utf-8"))
+        except (urllib.error.URLError, OSError, ValueError):
+            # 任务尚未开始或已结束
+            continue
+        current = (progress["done"], progress["total"])
+        # 总时长为 0 表示尚未开始对齐
+        if current[1] > 0 and current != last[0]:
+            last[0] = current
+            callback(*current)
+
+
+def remote_process(
+    server_url: str = DEFAULT_SERVER_URL,
+    timeout=None,
+    progress_callback=None,
+    poll_interval: float = 0.5,
+    **job,
+):
+    """把处理任务发送给对齐服务，返回与 process 相同格式的结果
+
+    progress_callback(已处理秒数, 总秒数) 指定时，在后台线程中轮询服务端的对齐进度。
+    """
+    poller = None
+    if progress_callback is not None:
+        job.setdefault("job_id", uuid.uuid4().hex)
+        stop = threading.Event()
+        last = [None]
+        poller = threading.Thread(
+            target=poll_progress,
+            args=(
+                server_url,
+                job["job_id"],
+                progress_callback,
+                stop,
+                poll_interval,
+                last,
+            ),
+            daemon=True,
+        )
+        poller.start()
+
+    request = urllib.request.Request(
+        f"{server_url}/process",
+        data=json.dumps(job, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            result = json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            detail = json.loads(e.read().decode("utf-8")).get("detail", e.reason)
+        except ValueError:
+            detail = e.reason
+        raise AlignerServerError(f"对齐服务处理失败: {detail}") from e
+    finally:
+        if poller is not None:
+            stop.set()
+            poller.join()
+
+    if poller is not None and (last[0] is None or last[0][0] < last[0][1]):
+        # 任务在两次轮询之间结束时补上最后一次进度
+        performance = result.get("statistics", {}).get("performance") or {}
+        total = last[0][1] if last[0] else performance.get("audio_duration")
+        if total:
+            progress_callback(total, total)
+    return result
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+常驻对齐服务：模型只加载一次，通过本地 HTTP 接收处理任务
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from flexible_processor import VIDEO_EXTENSIONS, FlexibleTextTimestampProcessor
+from waveform_cache import DEFAULT_WAVEFORM_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class AlignJob(BaseModel):
+    """一次处理任务，路径均为服务所在机器上的路径"""
+
+    media_path: str
+    text_input: str
+    language: str = "Japanese"
+    json_output: str | None = None
+    word_srt_output: str | None = None
+    sentence_srt_output: str | None = None
+    match_mode: str = "monotonic"
+    result_format: str = "json"
+    subtitle_formats: list[str] | None = None
+    long_audio_window: float = 0
+    long_audio_overlap: float = 30.0
+    metrics_output: str | None = None
+    previous_result: str | None = None
+    # 以下参数为 None 时沿用服务启动时的设置
+    max_segment_length: int | None = None
+    vad: bool | None = None
+    vad_threshold: float = -35.0
+    vad_min_silence: float = 1.0
+    vad_keep: float = 0.3
+    refine: bool | None = None
+    refine_threshold: float = 0.8
+    use_cache: bool | None = None
+    waveform_cache: bool = False
+    waveform_cache_dir: str | None = None
+    waveform_cache_size: int | None = None
+    work_dir: str | None = None
+    # 指定时可通过 /progress/{job_id} 查询对齐进度
+    job_id: str | None = None
+
+
+def configure_job(job_processor: FlexibleTextTimestampProcessor, job: AlignJob):
+    """按请求参数设置任务处理器"""
+    job_processor.set_match_mode(job.match_mode)
+    job_processor.set_result_format(job.result_format)
+    if job.subtitle_formats is not None:
+        job_processor.set_subtitle_formats(job.subtitle_formats)
+    job_processor.set_long_audio_mode(job.long_audio_window, job.long_audio_overlap)
+    if job.max_segment_length is not None:
+        job_processor.set_max_segment_length(job.max_segment_length or None)
+    if job.vad is not None:
+        job_processor.set_vad(
+            job.vad,
+            threshold_db=job.vad_threshold,
+            min_silence=job.vad_min_silence,
+            keep_silence=job.vad_keep,
+        )
+    if job.refine is not None:
+        job_processor.set_refinement(job.refine, threshold=job.refine_threshold)
+    if job.use_cache is False:
+        job_processor.disable_cache()
+    elif job.use_cache and job_processor.cache is None:
+        logger.warning("任务要求使用对齐缓存，但服务未启用缓存（以 --no-cache 启动）")
+    if job.waveform_cache:
+        job_processor.enable_waveform_cache(
+            job.waveform_cache_dir,
+            job.waveform_cache_size or DEFAULT_WAVEFORM_CACHE_BYTES,
+        )
+    if job.work_dir:
+        job_processor.set_checkpoint_dir(job.work_dir)
+
+
+def create_app(processor: FlexibleTextTimestampProcessor):
+    """创建对齐服务应用，所有任务共享同一个已加载的模型
+
+    每个请求在独立的任务处理器上执行，多个请求可以同时处理，只有模型调用串行执行。
+    """
+    app = FastAPI(title="Audio-Text Forced Alignment Server")
+    # job_id -> (已处理的音频秒数, 音频总秒数)，任务结束后删除
+    progress = {}
+
+    @app.get("/health")
+    def health():
+        return {
+            "status": "ok",
+            "model": processor.model_name,
+            "inference": processor.inference_config,
+            "cache": processor.cache is not None,
+        }
+
+    @app.get("/progress/{job_id}")
+    def job_progress(job_id: str):
+        if job_id not in progress:
+            raise HTTPException(status_code=404, detail=f"任务不存在或已结束: {job_id}")
+        done, total = progress[job_id]
+        return {"done": done, "total": total}
+
+    @app.post("/process")
+    def process(job: AlignJob):
+        if not Path(job.media_path).is_file():
+            raise HTTPException(
+                status_code=404, detail=f"媒体文件不存在: {job.media_path}"
+            )
+
+        try:
+            job_processor = processor.new_job()
+            configure_job(job_processor, job)
+            if job.job_id:
+                progress[job.job_id] = (0.0, 0.0)
+
+                def report(done, total):
+                    progress[job.job_id] = (done, total)
+
+                job_processor.set_progress_callback(report)
+            outputs = {
+                "json_output": job.json_output,
+                "word_srt_output": job.word_srt_output,
+                "sentence_srt_output": job.sentence_srt_output,
+                "metrics_output": job.metrics_output,
+                "previous_result": job.previous_result,
+            }
+            if Path(job.media_path).suffix.lower() in VIDEO_EXTENSIONS:
+                result = job_processor.process_media_file(
+                    media_path=job.media_path,
+                    text_input=job.text_input,
+                    language=job.language,
+                    **{k: v for k, v in outputs.items() if v is not None},
+                )
+            else:
+                result = job_processor.process(
+                    text_input=job.text_input,
+                    audio_path=job.media_path,
+                    language=job.language,
+                    **outputs,
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if job.job_id:
+                progress.pop(job.job_id, None)
+
+        if result is None:
+            raise HTTPException(status_code=500, detail="处理失败")
+        return result.to_dict()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻对齐服务")
+    parser.add_argument(
+        "--host", default=DEFAULT_HOST, help="监听地址 (默认: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="监听端口 (默认: 8765)"
+    )
+    parser.add_argument(
+        "--model", default="Qwen/Qwen3-ForcedAligner-0.6B", help="对齐模型名称或路径"
+    )
+    parser.add_argument(
+        "--stub", action="store_true", help="使用桩对齐器（离线测试用，不加载模型）"
+    )
+    parser.add_argument("--cache-dir", default=None, help="对齐结果缓存目录")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不读取也不写入对齐结果缓存"
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["auto", "float32", "bfloat16"],
+        default="auto",
+        help="模型精度，auto 在 CPU 上按启动测速选择 (默认: auto)",
+    )
+    parser.add_argument("--intra-op-threads", type=int, help="PyTorch 算子内线程数")
+    parser.add_argument("--inter-op-threads", type=int, help="PyTorch 算子间线程数")
+    parser.add_argument(
+        "--quantize-int8",
+        action="store_true",
+        help="对模型的 Linear 层做 int8 动态量化（CPU，使用 float32 加载）",
+    )
+    parser.add_argument(
+        "--vad", action="store_true", help="对齐前压缩长静音段，结果映射回原始时间轴"
+    )
+    parser.add_argument(
+        "--vad-threshold",
+        type=float,
+        default=-35.0,
+        help="静音阈值，相对于较响部分的分贝数 (默认: -35)",
+    )
+    parser.add_argument(
+        "--vad-min-silence",
+        type=float,
+        default=1.0,
+        help="压缩的最短静音时长（秒） (默认: 1.0)",
+    )
+    parser.add_argument(
+        "--vad-keep",
+        type=float,
+        default=0.3,
+        help="每个静音段压缩后保留的时长（秒） (默认: 0.3)",
+    )
+    parser.add_argument(
+        "--refine",
+        action="store_true",
+        help="匹配后对低分或未匹配的文本段所在区间做二次对齐",
+    )
+    parser.add_argument(
+        "--refine-threshold",
+        type=float,
+        default=0.8,
+        help="二次对齐的得分阈值，低于该分数的文本段重新对齐 (默认: 0.8)",
+    )
+    parser.add_argument("--log-level", default="INFO", help="日志级别 (默认: INFO)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(message)s"
+    )
+
+    import uvicorn
+
+    aligner = None
+    if args.stub:
+        from stub_aligner import StubForcedAligner
+
+        aligner = StubForcedAligner()
+
+    processor = FlexibleTextTimestampProcessor(model_name=args.model, aligner=aligner)
+    processor.set_cpu_profile(
+        dtype=args.dtype,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        quantize=args.quantize_int8,
+    )
+    if args.refine:
+        processor.set_refinement(threshold=args.refine_threshold)
+    if args.vad:
+        processor.set_vad(
+            threshold_db=args.vad_threshold,
+            min_silence=args.vad_min_silence,
+            keep_silence=args.vad_keep,
+        )
+    if not args.no_cache:
+        processor.enable_cache(args.cache_dir)
+    processor.load_model()
+
+    logger.info(f"对齐服务启动: http://{args.host}:{args.port}")
+    uvicorn.run(create_app(processor), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+对齐结果缓存：以音频内容、文本、模型与语言的哈希为键，把字词时间戳保存在磁盘上
+"""
+
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get(
+        "ALIGNER_CACHE_DIR", Path.home() / ".cache" / "forced-aligner" / "alignments"
+    )
+)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def normalize_text(text: str):
+    """规范化文本：统一 Unicode 形式并去除行尾空白"""
+    text = unicodedata.normalize("NFC", text)
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def hash_audio(audio, hasher):
+    """把音频内容写入哈希：文件路径按字节读取，解码后的波形按数组内容"""
+    if isinstance(audio, (str, Path)):
+        with open(audio, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    elif isinstance(audio, tuple):
+        waveform, sample_rate = audio
+        hasher.update(str(sample_rate).encode("utf-8"))
+        hasher.update(memoryview(waveform).cast("B"))
+    else:
+        raise TypeError(f"不支持的音频类型: {type(audio)}")
+
+
+def alignment_key(audio, text: str, model_name: str, language: str, **options):
+    """由音频内容、文本、模型、语言与其他影响对齐结果的参数计算哈希键"""
+    hasher = hashlib.sha256()
+    hash_audio(audio, hasher)
+    meta = {
+        "text": normalize_text(text),
+        "model": model_name,
+        "language": language,
+        "options": options,
+    }
+    hasher.update(json.dumps(meta, ensure_ascii=False, sort_keys=True).encode())
+    return hasher.hexdigest()
+
+
+class AlignmentCache:
+    """按大小做 LRU 淘汰的字词时间戳磁盘缓存"""
+
+    def __init__(self, cache_dir=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, audio, text: str, model_name: str, language: str, **options):
+        """计算缓存键，options 为其他影响对齐结果的参数"""
+        return alignment_key(audio, text, model_name, language, **options)
+
+    def path_for(self, key: str):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str):
+        """读取缓存的字词时间戳，未命中时返回 None"""
+        path = self.path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                word_timestamps = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 更新访问时间，供 LRU 淘汰使用；条目可能刚被其他进程淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return word_timestamps
+
+    def put(self, key: str, word_timestamps):
+        """写入字词时间戳，并按总大小淘汰最久未使用的条目"""
+        path = self.path_for(key)
+        # 临时文件名区分进程与线程，同时写入同一条目时互不覆盖
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(word_timestamps, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def entries(self):
+        """按最近使用时间从旧到新列出缓存文件"""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空缓存，返回删除的条目数"""
+        removed = 0
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
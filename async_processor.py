@@ -0,0 +1,225 @@
+"""
+asyncio 处理接口：供异步 Web 服务嵌入，解码、推理、匹配与写出都不阻塞事件循环
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from audio_io import SAMPLE_RATE, decode_audio_async
+from flexible_processor import (
+    AUDIO_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    FlexibleTextTimestampProcessor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncProcessor:
+    """包装一个 FlexibleTextTimestampProcessor，提供 async 版本的 process / process_media_file
+
+    - 媒体解码以异步子进程运行；
+    - 推理在专用线程池中执行，inference_workers 为同时调用模型的线程数（默认 1，模型调用串行）；
+    - 文本读取、匹配与文件写出在默认线程池中执行；
+    - max_jobs 限制同时处理的任务数，从而限制内存中解码后波形的数量。
+
+    每个任务在 new_job() 创建的任务处理器上执行，只共享已加载的模型与配置。
+    """
+
+    def __init__(
+        self,
+        processor: FlexibleTextTimestampProcessor = None,
+        max_jobs: int = 4,
+        inference_workers: int = 1,
+    ):
+        if max_jobs <= 0 or inference_workers <= 0:
+            raise ValueError("max_jobs 与 inference_workers 必须大于 0")
+        self.processor = processor or FlexibleTextTimestampProcessor()
+        self.max_jobs = max_jobs
+        self.inference_executor = ThreadPoolExecutor(
+            inference_workers, thread_name_prefix="aligner-inference"
+        )
+        self._job_slots = None
+        self._model_lock = None
+
+    async def __aenter__(self):
+        await self.load_model()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """关闭推理线程池，等待正在执行的推理结束"""
+        self.inference_executor.shutdown(wait=True)
+
+    async def load_model(self):
+        """在推理线程池中加载模型（只加载一次）"""
+        if self._model_lock is None:
+            self._model_lock = asyncio.Lock()
+        async with self._model_lock:
+            if self.processor.model is None:
+                await self.run_inference(self.processor.load_model)
+
+    async def run_inference(self, func, *args):
+        """在推理线程池中执行 func
+
+        调用方被取消时，已开始的推理会在后台执行完毕再释放线程，不会同时占用更多线程。
+        """
+        future = self.inference_executor.submit(func, *args)
+        return await asyncio.wrap_future(future)
+
+    async def process(
+        self,
+        text_input,
+        audio_path,
+        language="Japanese",
+        json_output=None,
+        word_srt_output=None,
+        sentence_srt_output=None,
+        metrics_output=None,
+        previous_result=None,
+        timeout: float = None,
+    ):
+        """process 的异步版本，返回只读的 JobResult；超过 timeout 秒时抛出 asyncio.TimeoutError"""
+        if self._job_slots is None:
+            self._job_slots = asyncio.Semaphore(self.max_jobs)
+        async with self._job_slots:
+            return await asyncio.wait_for(
+                self._process(
+                    text_input,
+                    str(audio_path),
+                    language,
+                    json_output,
+                    word_srt_output,
+                    sentence_srt_output,
+                    metrics_output,
+                    previous_result,
+                ),
+                timeout,
+            )
+
+    async def _process(
+        self,
+        text_input,
+        audio_path,
+        language,
+        json_output,
+        word_srt_output,
+        sentence_srt_output,
+        metrics_output,
+        previous_result,
+    ):
+        await self.load_model()
+        job = self.processor.new_job()
+        logger.info(f"开始异步处理: {audio_path}")
+
+        with job.metrics.stage("load_text"):
+            text = await asyncio.to_thread(job.load_text, text_input)
+        with job.metrics.stage("split_text"):
+            await asyncio.to_thread(
+                job.split_text, text, job.text_file_path(text_input)
+            )
+
+        checkpoint = None
+        if job.work_dir and not previous_result:
+            checkpoint = await asyncio.to_thread(
+                job.open_checkpoint, audio_path, text, language
+            )
+
+        if previous_result:
+            await self.run_inference(
+                job.realign_incremental, previous_result, text, audio_path, language
+            )
+        elif job.long_audio_window or job.shard_workers or checkpoint is not None:
+            # 分窗对齐在每个窗口内自行解码音频；分片对齐与检查点沿用同步流程，
+            # 在推理线程池中执行
+            await self.run_inference(
+                job.run_stage,
+                checkpoint,
+                "align",
+                lambda: job.get_word_timestamps(text, audio_path, language, checkpoint),
+            )
+        else:
+            await self.align(job, text, audio_path, language)
+
+        await asyncio.to_thread(job.optimized_matching)
+        if job.refinement:
+            refined = await self.run_inference(
+                job.run_stage,
+                checkpoint,
+                "refine",
+                lambda: job.refine_alignment(text, audio_path, language),
+            )
+            if not refined:
+                await asyncio.to_thread(job.optimized_matching)
+
+        def finish():
+            outputs = job.write_outputs(
+                json_output or job.get_output_filename(audio_path, ".json"),
+                word_srt_output or job.get_output_filename(audio_path, "_word.srt"),
+                sentence_srt_output
+                or job.get_output_filename(audio_path, "_sentence.srt"),
+            )
+            job.finish_progress()
+            if checkpoint is not None:
+                checkpoint.remove()
+            return job.job_result(
+                job.collect_performance(metrics_output, audio_path), *outputs
+            )
+
+        result = await asyncio.to_thread(finish)
+        logger.info(f"异步处理完成: {audio_path}")
+        return result
+
+    async def align(self, job, text, audio_path, language):
+        """查询缓存，未命中时异步解码并在推理线程池中对齐（不使用分片对齐与检查点时）"""
+        cache_key = None
+        if job.cache is not None:
+            cache_key = await asyncio.to_thread(
+                job.alignment_cache_key, audio_path, text, language
+            )
+            cached = await asyncio.to_thread(job.cache.get, cache_key)
+            job.metrics.set("cache_hit", cached is not None)
+            if cached is not None:
+                job.word_timestamps = cached
+                return
+
+        with job.metrics.stage("decode"):
+            waveform = None
+            if job.waveform_cache is not None:
+                waveform_key = await asyncio.to_thread(
+                    job.waveform_cache.make_key, audio_path, SAMPLE_RATE
+                )
+                waveform = await asyncio.to_thread(job.waveform_cache.get, waveform_key)
+            if waveform is None:
+                waveform = await decode_audio_async(audio_path, SAMPLE_RATE)
+                if job.waveform_cache is not None:
+                    await asyncio.to_thread(
+                        job.waveform_cache.put, waveform_key, waveform
+                    )
+        duration = len(waveform) / SAMPLE_RATE
+        job.metrics.set("audio_duration", round(duration, 3))
+        job.report_stage("decode", duration)
+
+        with job.metrics.stage("align"):
+            job.word_timestamps = await self.run_inference(
+                job.align_words, (waveform, SAMPLE_RATE), text, language
+            )
+        del waveform
+        job.report_stage("align", duration)
+
+        if cache_key is not None:
+            await asyncio.to_thread(job.cache.put, cache_key, job.word_timestamps)
+
+    async def process_media_file(self, media_path, text_input, **kwargs):
+        """process_media_file 的异步版本：检查媒体格式后调用 process"""
+        media_path = str(media_path)
+        media_ext = Path(media_path).suffix.lower()
+        if not Path(media_path).is_file():
+            raise FileNotFoundError(f"媒体文件不存在: {media_path}")
+        if media_ext not in VIDEO_EXTENSIONS | AUDIO_EXTENSIONS:
+            raise ValueError(f"不支持的媒体格式: {media_ext}")
+        return await self.process(text_input, media_path, **kwargs)
@@ -0,0 +1,208 @@
+"""
+音频读取工具（基于 FFmpeg）
+"""
+
+import asyncio
+import subprocess
+import tempfile
+
+import numpy as np
+
+# Qwen3-ForcedAligner 使用的采样率
+SAMPLE_RATE = 16000
+
+
+def get_duration(media_path: str):
+    """使用 ffprobe 获取媒体文件时长（秒），系统中没有 FFmpeg 时使用 PyAV"""
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        str(media_path),
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, encoding="utf-8", errors="replace"
+        )
+    except FileNotFoundError:
+        return _duration_with_av(media_path)
+    if result.returncode != 0:
+        raise RuntimeError(f"获取媒体时长失败: {result.stderr.strip()}")
+    return float(result.stdout.strip())
+
+
+def _duration_with_av(media_path: str):
+    import av
+
+    with av.open(str(media_path)) as container:
+        if container.duration is not None:
+            return container.duration / av.time_base
+        stream = container.streams.audio[0]
+        return float(stream.duration * stream.time_base)
+
+
+def load_audio_window(
+    media_path: str, start: float, duration: float, sample_rate: int = SAMPLE_RATE
+):
+    """解码媒体文件中 [start, start + duration) 区间的音频
+
+    FFmpeg 只解码该区间并直接输出单声道 float32 PCM，内存占用与区间长度成正比。
+    系统中没有 FFmpeg 时使用 PyAV 定位并解码。
+    """
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{duration:.3f}",
+        "-i",
+        str(media_path),
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "-",
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+    except FileNotFoundError:
+        return _load_window_with_av(media_path, start, duration, sample_rate)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"音频解码失败: {stderr}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _load_window_with_av(
+    media_path: str, start: float, duration: float, sample_rate: int
+):
+    """使用 PyAV 跳转到区间起点附近解码，再按采样数截取区间"""
+    import av
+
+    chunks = []
+    first_time = None
+    needed = int(round((start + duration) * sample_rate))
+    with av.open(str(media_path)) as container:
+        stream = container.streams.audio[0]
+        # 跳转到 start 之前最近的关键帧
+        container.seek(int(start * av.time_base))
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        decoded = 0
+        for frame in container.decode(stream):
+            if first_time is None:
+                first_time = frame.time or 0.0
+            for resampled in resampler.resample(frame):
+                chunk = resampled.to_ndarray().reshape(-1)
+                chunks.append(chunk)
+                decoded += len(chunk)
+            if int(first_time * sample_rate) + decoded >= needed:
+                break
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    waveform = np.concatenate(chunks).astype(np.float32, copy=False)
+    offset = max(0, int(round((start - first_time) * sample_rate)))
+    return waveform[offset : offset + int(round(duration * sample_rate))]
+
+
+def decode_audio(media_path: str, sample_rate: int = SAMPLE_RATE):
+    """把音频或视频文件解码为单声道 float32 波形，不写临时文件
+
+    优先通过 FFmpeg 管道读取 PCM，系统中没有 FFmpeg 时使用 PyAV 解码。
+    """
+    try:
+        return _decode_with_ffmpeg(media_path, sample_rate)
+    except FileNotFoundError:
+        return _decode_with_av(media_path, sample_rate)
+
+
+async def decode_audio_async(media_path: str, sample_rate: int = SAMPLE_RATE):
+    """decode_audio 的异步版本：FFmpeg 作为异步子进程运行，不阻塞事件循环
+
+    任务被取消时终止 FFmpeg 进程。没有 FFmpeg 时在线程中使用 PyAV 解码。
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *_ffmpeg_decode_cmd(media_path, sample_rate),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        return await asyncio.to_thread(_decode_with_av, media_path, sample_rate)
+
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        stderr = stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"音频解码失败: {stderr}")
+    return np.frombuffer(stdout, dtype=np.float32)
+
+
+def _ffmpeg_decode_cmd(media_path: str, sample_rate: int):
+    return [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        str(media_path),
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "-",
+    ]
+
+
+def _decode_with_ffmpeg(media_path: str, sample_rate: int):
+    """从 FFmpeg 的标准输出流式读取 PCM
+
+    标准错误输出写入临时文件：读取标准输出期间 FFmpeg 输出大量错误信息时，
+    管道写满会使两个进程互相等待。
+    """
+    cmd = _ffmpeg_decode_cmd(media_path, sample_rate)
+    buffer = bytearray()
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=stderr_file
+        ) as process:
+            for chunk in iter(lambda: process.stdout.read(1024 * 1024), b""):
+                buffer += chunk
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+    if process.returncode != 0:
+        stderr = stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"音频解码失败: {stderr}")
+    return np.frombuffer(buffer, dtype=np.float32)
+
+
+def _decode_with_av(media_path: str, sample_rate: int):
+    """使用 PyAV 解码并重采样"""
+    import av
+
+    chunks = []
+    with av.open(str(media_path)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
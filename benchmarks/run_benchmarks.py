@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+离线基准测试：用桩对齐器替换 Qwen3ForcedAligner，在合成文本上测量各阶段的吞吐量与峰值内存
+
+不需要 GPU、模型或网络。每个用例在独立的子进程中运行，峰值内存互不影响。
+结果与 baselines.json 比较，吞吐量或匹配率低于基线超过容差时以非零状态退出。
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from flexible_processor import FlexibleTextTimestampProcessor  # noqa: E402
+from instrumentation import StageMetrics  # noqa: E402
+from stub_aligner import StubForcedAligner  # noqa: E402
+from subtitle_writer import format_clock, time_columns, to_milliseconds  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+LANGUAGES = {"ja": "Japanese", "zh": "Chinese", "en": "English"}
+# 默认标点不含英文句号，英文文本需要单独指定分割标点
+PUNCTUATION = {"ja": "、。！？", "zh": "，。！？", "en": ".!?"}
+CASES = ("clean", "noisy", "mismatched")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+FULL_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+# 基线耗时低于该值（秒）的阶段计时噪声太大，不参与回归比较
+MIN_COMPARE_TIME = 0.2
+
+STAGES = (
+    "split_text",
+    "align",
+    "build_word_index",
+    "matching",
+    "format_time",
+    "write_result",
+    "write_subtitles",
+)
+
+HIRAGANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+KANJI = "日本語世界時間富士山絵画家江戸人年月今天気東京大学生先会社電車駅店本手目口耳心"
+HANZI = "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长"
+ENGLISH_WORDS = (
+    "the quick brown fox jumps over lazy dog river mountain city light "
+    "morning evening painter famous world people choose magazine thousand "
+    "years history artist print wave ocean ship travel garden market"
+).split()
+
+
+def generate_text(language: str, num_words: int, seed: int = 0):
+    """生成约 num_words 个对齐单位（中日文为单字，英文为单词）的合成文本"""
+    rng = random.Random(seed)
+    sentences = []
+    count = 0
+    while count < num_words:
+        length = rng.randint(6, 30)
+        if language == "en":
+            words = [rng.choice(ENGLISH_WORDS) for _ in range(length)]
+            sentences.append(" ".join(words).capitalize() + ".")
+        else:
+            alphabet = HIRAGANA + KATAKANA + KANJI if language == "ja" else HANZI
+            chars = [rng.choice(alphabet) for _ in range(length)]
+            if length > 12:
+                chars.insert(
+                    rng.randint(4, length - 4), "、" if language == "ja" else "，"
+                )
+            sentences.append("".join(chars) + "。")
+        count += length
+    separator = " " if language == "en" else ""
+    return separator.join(sentences)
+
+
+def perturb_text(text: str, language: str, rate: float, seed: int = 1):
+    """模拟识别噪声：按 rate 的比例随机替换或删除字符（英文按单词）"""
+    rng = random.Random(seed)
+    if language == "en":
+        words = text.split(" ")
+        result = []
+        for word in words:
+            r = rng.random()
+            if r < rate / 2:
+                continue
+            if r < rate:
+                word = rng.choice(ENGLISH_WORDS)
+            result.append(word)
+        return " ".join(result)
+
+    alphabet = HANZI if language == "zh" else HIRAGANA + KANJI
+    chars = []
+    for char in text:
+        r = rng.random()
+        if char not in "。、，" and r < rate / 2:
+            continue
+        if char not in "。、，" and r < rate:
+            char = rng.choice(alphabet)
+        chars.append(char)
+    return "".join(chars)
+
+
+def drop_sentences(text: str, language: str, rate: float, seed: int = 2):
+    """模拟文本与音频不一致：按 rate 的比例删去音频中没有朗读的句子"""
+    rng = random.Random(seed)
+    if language == "en":
+        sentences = [s + "." for s in text.split(". ") if s]
+        kept = [s for s in sentences if rng.random() >= rate]
+        return " ".join(kept)
+    sentences = [s + "。" for s in text.split("。") if s]
+    return "".join(s for s in sentences if rng.random() >= rate)
+
+
+def build_case(language: str, size: int, case: str):
+    """返回 (文本稿, 桩对齐器实际"听到"的文本)"""
+    text = generate_text(language, size)
+    if case == "clean":
+        return text, text
+    if case == "noisy":
+        return text, perturb_text(text, language, rate=0.05)
+    if case == "mismatched":
+        return text, drop_sentences(text, language, rate=0.1)
+    raise ValueError(f"未知用例: {case}")
+
+
+def run_case(language: str, size: int, case: str, match_mode: str, result_format: str):
+    """运行单个用例，返回各阶段的耗时、峰值内存与吞吐量"""
+    text, spoken_text = build_case(language, size, case)
+    processor = FlexibleTextTimestampProcessor(aligner=StubForcedAligner())
+    processor.set_custom_punctuation(PUNCTUATION[language])
+    processor.set_match_mode(match_mode)
+    processor.set_result_format(result_format)
+    metrics = processor.metrics = StageMetrics()
+
+    with metrics.stage("split_text"):
+        processor.split_text(text)
+    # 桩对齐器不读取音频，传入 None 时按固定语速生成时间戳
+    with metrics.stage("align"):
+        processor.word_timestamps = processor.align_words(
+            None, spoken_text, LANGUAGES[language]
+        )
+    with metrics.stage("build_word_index"):
+        processor.build_word_index()
+    processor.optimized_matching()
+    with metrics.stage("format_time"):
+        starts, ends, _ = time_columns(processor.word_timestamps)
+        format_clock(to_milliseconds(np.concatenate([starts, ends])))
+
+    suffix = ".npz" if result_format == "npz" else ".json"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        processor.write_outputs(
+            os.path.join(temp_dir, f"result{suffix}"),
+            os.path.join(temp_dir, "word.srt"),
+            os.path.join(temp_dir, "sentence.srt"),
+        )
+
+    performance = metrics.to_dict()
+    num_words = len(processor.word_timestamps)
+    matched = sum(1 for s in processor.matched_segments if s["match_score"] > 0.8)
+    stages = {}
+    for name in STAGES:
+        stage = performance["stages"][name]
+        wall_time = stage["wall_time"]
+        stages[name] = {
+            "wall_time": wall_time,
+            "words_per_sec": round(num_words / wall_time) if wall_time else None,
+            "rss_delta_mb": stage.get("rss_delta_mb"),
+            "process_peak_rss_mb": stage.get("process_peak_rss_mb"),
+        }
+    return {
+        "words": num_words,
+        "segments": len(processor.text_segments),
+        "matched_segments": matched,
+        # 以全部文本段为分母：未匹配的文本段也计入
+        "match_rate": round(matched / len(processor.text_segments), 4),
+        "total_time": performance["total_time"],
+        "stages": stages,
+    }
+
+
+def run_isolated(*args):
+    """在新的子进程中运行用例，使进程峰值内存只反映该用例"""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, args)
+
+
+def best_of(runs):
+    """合并多次运行的结果：每个阶段取最短耗时，内存增量与峰值内存取最大值"""
+    result = runs[0]
+    for run in runs[1:]:
+        for name, stage in run["stages"].items():
+            best = result["stages"][name]
+            if stage["wall_time"] < best["wall_time"]:
+                best["wall_time"] = stage["wall_time"]
+                best["words_per_sec"] = stage["words_per_sec"]
+            for key in ("rss_delta_mb", "process_peak_rss_mb"):
+                if stage[key] is not None:
+                    best[key] = max(
+                        stage[key] if best[key] is None else best[key], stage[key]
+                    )
+        result["total_time"] = min(result["total_time"], run["total_time"])
+    return result
+
+
+def case_name(language, size, case):
+    return f"{language}-{size}-{case}"
+
+
+def compare(results, baselines, tolerance: float):
+    """与基线比较，返回回归描述列表"""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if result["match_rate"] < baseline["match_rate"] - 0.01:
+            regressions.append(
+                f"{name}: 匹配率 {result['match_rate']:.2%} "
+                f"低于基线 {baseline['match_rate']:.2%}"
+            )
+        for stage, base in baseline["stages"].items():
+            current = result["stages"].get(stage, {}).get("words_per_sec")
+            expected = base.get("words_per_sec")
+            if not current or not expected or base["wall_time"] < MIN_COMPARE_TIME:
+                continue
+            if current < expected * (1 - tolerance):
+                regressions.append(
+                    f"{name} {stage}: {current:,} 词/秒，"
+                    f"基线 {expected:,} 词/秒（{current / expected - 1:+.0%}）"
+                )
+    return regressions
+
+
+def format_result(name, result, baseline=None):
+    lines = [
+        f"{name}: {result['words']:,} 词, {result['segments']:,} 段, "
+        f"高质量匹配 {result['matched_segments']:,} 段, "
+        f"匹配率 {result['match_rate']:.2%}, 总耗时 {result['total_time']:.2f}s"
+    ]
+    for stage, data in result["stages"].items():
+        speed = data["words_per_sec"]
+        line = f"  {stage:<20} {data['wall_time']:>9.4f}s"
+        line += f" {speed:>14,} 词/秒" if speed else f" {'-':>14}"
+        if data["rss_delta_mb"] is not None:
+            line += f"  内存增量 {data['rss_delta_mb']:>+8.1f} MB"
+        if data["process_peak_rss_mb"] is not None:
+            line += f"  进程峰值 {data['process_peak_rss_mb']:>8.1f} MB"
+        if baseline and stage in baseline["stages"]:
+            expected = baseline["stages"][stage].get("words_per_sec")
+            if speed and expected:
+                line += f"  ({speed / expected - 1:+.0%} 对比基线)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试（桩对齐器 + 合成文本）")
+    parser.add_argument(
+        "--languages",
+        nargs="+",
+        choices=list(LANGUAGES),
+        default=list(LANGUAGES),
+        help="测试的语言 (默认: ja zh en)",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=None,
+        help="文本规模（词数） (默认: 1000 10000 100000)",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="包括 100 万词的用例（需要数 GB 内存）"
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=CASES,
+        default=list(CASES),
+        help="用例: clean 完全一致, noisy 识别噪声, mismatched 文本多出未朗读的句子",
+    )
+    parser.add_argument(
+        "--match-mode",
+        choices=["monotonic", "legacy"],
+        default="monotonic",
+        help="匹配算法 (默认: monotonic)",
+    )
+    parser.add_argument(
+        "--result-format",
+        choices=["json", "compact", "npz"],
+        default="json",
+        help="结果文件格式 (默认: json)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="每个用例重复运行的次数，各阶段取最短耗时 (默认: 3)",
+    )
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="基线文件路径")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="允许的吞吐量下降比例，超过即视为回归 (默认: 0.5)",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="用本次结果覆盖基线"
+    )
+    parser.add_argument("--output", help="把本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    baseline_key = f"{args.match_mode}-{args.result_format}"
+    baselines = {}
+    if Path(args.baseline).exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f).get(baseline_key, {})
+
+    results = {}
+    for language in args.languages:
+        for size in sizes:
+            for case in args.cases:
+                name = case_name(language, size, case)
+                result = best_of(
+                    [
+                        run_isolated(
+                            language, size, case, args.match_mode, args.result_format
+                        )
+                        for _ in range(args.repeat)
+                    ]
+                )
+                results[name] = result
+                print(format_result(name, result, baselines.get(name)), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        data = {}
+        if Path(args.baseline).exists():
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        data.setdefault(baseline_key, {}).update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n基线已更新: {args.baseline}")
+        return
+
+    regressions = compare(results, baselines, args.tolerance)
+    if regressions:
+        print(f"\n❌ 发现 {len(regressions)} 项性能回归:")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    if baselines:
+        print("\n✅ 未发现性能回归")
+    else:
+        print(f"\n没有 {baseline_key} 的基线，可使用 --update-baseline 生成")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+任务检查点：长任务按音频块保存已完成的字词时间戳与阶段，中断后从最后一个检查点继续
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class JobCheckpoint:
+    """保存在 work_dir/<任务键>/ 下的任务检查点
+
+    - chunks.jsonl：每个已对齐的音频块一行，包含该块提交的字词与下一块的起点，
+      每行写入后立即落盘，中断时最多丢失正在处理的块；
+    - <阶段名>.json：已完成阶段的完整字词时间戳。
+
+    任务键由媒体内容、文本、模型与对齐参数决定，输入改变时不会误用旧的检查点。
+    """
+
+    CHUNKS_FILE = "chunks.jsonl"
+
+    def __init__(self, work_dir, key: str):
+        self.path = Path(work_dir) / key
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def stage_path(self, stage: str):
+        return self.path / f"{stage}.json"
+
+    def has_stage(self, stage: str):
+        return self.stage_path(stage).is_file()
+
+    def load_stage(self, stage: str):
+        """读取已完成阶段保存的字词时间戳"""
+        with open(self.stage_path(stage), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_stage(self, stage: str, word_timestamps):
+        """保存阶段结果：先写临时文件再替换，中断时不会留下不完整的文件"""
+        path = self.stage_path(stage)
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(word_timestamps, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def save_chunk(self, word_timestamps, next_segment: int, next_start: float):
+        """追加一个已对齐音频块的字词，以及下一块的文本段下标与起始时间"""
+        record = {
+            "next_segment": next_segment,
+            "next_start": next_start,
+            "words": word_timestamps,
+        }
+        with open(self.path / self.CHUNKS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def resume_point(self):
+        """读取已保存的音频块，返回 (字词时间戳, 下一个文本段下标, 下一块起始时间)
+
+        没有检查点时返回 None；中断时写了一半的最后一行会被忽略。
+        """
+        path = self.path / self.CHUNKS_FILE
+        if not path.is_file():
+            return None
+
+        words = []
+        record = None
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    chunk = json.loads(line)
+                except ValueError:
+                    break
+                words.extend(chunk["words"])
+                record = chunk
+                valid_bytes += len(line)
+        if record is None:
+            return None
+        # 截掉不完整的行，之后追加的块从正确的位置开始
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+        logger.info(
+            f"从检查点继续: 已完成 {len(words)} 个词，"
+            f"从 {record['next_start']:.1f}s 处继续对齐"
+        )
+        return words, record["next_segment"], record["next_start"]
+
+    def remove(self):
+        """任务完成后删除检查点"""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,242 @@
+"""
+字词时间戳与匹配结果的列式存储，以及紧凑的结果文件格式
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPACT_FORMAT_VERSION = 1
+
+
+class TextColumn:
+    """多个字符串拼接为一个文本缓冲区，用偏移数组定位每个字符串"""
+
+    def __init__(self, buffer: str, offsets):
+        self.buffer = buffer
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_strings(cls, strings):
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in strings], out=offsets[1:])
+        return cls("".join(strings), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.buffer[self.offsets[i] : self.offsets[i + 1]]
+
+    def to_list(self):
+        offsets = self.offsets.tolist()
+        return [self.buffer[a:b] for a, b in zip(offsets, offsets[1:])]
+
+
+class WordColumns:
+    """字词时间戳的列式表示：起止时间为浮点数组，文本为单一缓冲区加偏移"""
+
+    def __init__(self, text: TextColumn, start_times, end_times):
+        self.text = text
+        self.start_times = np.asarray(start_times, dtype=np.float64)
+        self.end_times = np.asarray(end_times, dtype=np.float64)
+
+    @classmethod
+    def from_word_timestamps(cls, word_timestamps):
+        return cls(
+            TextColumn.from_strings([w["text"] for w in word_timestamps]),
+            np.fromiter(
+                (w["start_time"] for w in word_timestamps),
+                dtype=np.float64,
+                count=len(word_timestamps),
+            ),
+            np.fromiter(
+                (w["end_time"] for w in word_timestamps),
+                dtype=np.float64,
+                count=len(word_timestamps),
+            ),
+        )
+
+    def __len__(self):
+        return len(self.start_times)
+
+    def to_word_timestamps(self):
+        return [
+            {"text": text, "start_time": start, "end_time": end}
+            for text, start, end in zip(
+                self.text.to_list(),
+                self.start_times.tolist(),
+                self.end_times.tolist(),
+            )
+        ]
+
+
+class SegmentColumns:
+    """匹配结果的列式表示：每段只保存字词下标区间，不复制字词"""
+
+    def __init__(self, text: TextColumn, word_start, word_end, match_score):
+        self.text = text
+        self.word_start = np.asarray(word_start, dtype=np.int64)
+        self.word_end = np.asarray(word_end, dtype=np.int64)
+        self.match_score = np.asarray(match_score, dtype=np.float64)
+
+    @classmethod
+    def from_matched_segments(cls, matched_segments, word_timestamps):
+        # 匹配结果中的字词是 word_timestamps 中同一对象的切片，按对象定位下标
+        position = {id(word): i for i, word in enumerate(word_timestamps)}
+        word_start = np.zeros(len(matched_segments), dtype=np.int64)
+        word_end = np.zeros(len(matched_segments), dtype=np.int64)
+        for i, segment in enumerate(matched_segments):
+            words = segment["words"]
+            if words:
+                word_start[i] = position[id(words[0])]
+                word_end[i] = position[id(words[-1])] + 1
+        return cls(
+            TextColumn.from_strings([s["text"] for s in matched_segments]),
+            word_start,
+            word_end,
+            [s["match_score"] for s in matched_segments],
+        )
+
+    def __len__(self):
+        return len(self.word_start)
+
+    def to_matched_segments(self, word_timestamps):
+        segments = []
+        for text, start, end, score in zip(
+            self.text.to_list(),
+            self.word_start.tolist(),
+            self.word_end.tolist(),
+            self.match_score.tolist(),
+        ):
+            words = word_timestamps[start:end]
+            segments.append(
+                {
+                    "text": text,
+                    "start_time": words[0]["start_time"] if words else 0.0,
+                    "end_time": words[-1]["end_time"] if words else 0.0,
+                    "words": words,
+                    "match_score": score,
+                    "segment_type": "sentence",
+                }
+            )
+        return segments
+
+
+def save_compact_json(
+    output_path, words: WordColumns, segments, statistics, text_segments
+):
+    """保存紧凑 JSON：字词只保存一次，文本段用字词下标区间引用字词"""
+    data = {
+        "format": "compact",
+        "version": COMPACT_FORMAT_VERSION,
+        "statistics": statistics,
+        "text_segments": list(text_segments),
+        "words": {
+            "text": words.text.to_list(),
+            "start_time": words.start_times.tolist(),
+            "end_time": words.end_times.tolist(),
+        },
+        "segments": {
+            "text": segments.text.to_list(),
+            "word_start": segments.word_start.tolist(),
+            "word_end": segments.word_end.tolist(),
+            "match_score": segments.match_score.tolist(),
+        },
+    }
+    if orjson is not None:
+        with open(output_path, "wb") as f:
+            f.write(orjson.dumps(data))
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    return output_path
+
+
+def save_npz(output_path, words: WordColumns, segments, statistics, text_segments):
+    """保存为 NumPy .npz 压缩文件，文本缓冲区以 UTF-8 字节数组保存"""
+    segment_texts = TextColumn.from_strings(list(text_segments))
+    np.savez_compressed(
+        output_path,
+        word_text=np.frombuffer(words.text.buffer.encode("utf-8"), dtype=np.uint8),
+        word_text_offsets=_byte_offsets(words.text),
+        word_start_time=words.start_times,
+        word_end_time=words.end_times,
+        segment_text=np.frombuffer(
+            segments.text.buffer.encode("utf-8"), dtype=np.uint8
+        ),
+        segment_text_offsets=_byte_offsets(segments.text),
+        segment_word_start=segments.word_start,
+        segment_word_end=segments.word_end,
+        segment_match_score=segments.match_score,
+        text_segments=np.frombuffer(
+            segment_texts.buffer.encode("utf-8"), dtype=np.uint8
+        ),
+        text_segments_offsets=_byte_offsets(segment_texts),
+        statistics=np.frombuffer(
+            json.dumps(statistics, ensure_ascii=False).encode("utf-8"), dtype=np.uint8
+        ),
+    )
+    return output_path
+
+
+def _byte_offsets(column: TextColumn):
+    """把字符偏移转换为 UTF-8 字节偏移"""
+    lengths = [len(s.encode("utf-8")) for s in column.to_list()]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _decode_text_column(data: bytes, byte_offsets):
+    strings = [
+        data[a:b].decode("utf-8")
+        for a, b in zip(byte_offsets.tolist(), byte_offsets.tolist()[1:])
+    ]
+    return TextColumn.from_strings(strings)
+
+
+def load_compact_result(input_path):
+    """读取紧凑 JSON 或 .npz 结果，返回 (words, segments, statistics, text_segments)"""
+    if str(input_path).endswith(".npz"):
+        with np.load(input_path) as data:
+            words = WordColumns(
+                _decode_text_column(
+                    data["word_text"].tobytes(), data["word_text_offsets"]
+                ),
+                data["word_start_time"],
+                data["word_end_time"],
+            )
+            segments = SegmentColumns(
+                _decode_text_column(
+                    data["segment_text"].tobytes(), data["segment_text_offsets"]
+                ),
+                data["segment_word_start"],
+                data["segment_word_end"],
+                data["segment_match_score"],
+            )
+            text_segments = _decode_text_column(
+                data["text_segments"].tobytes(), data["text_segments_offsets"]
+            ).to_list()
+            statistics = json.loads(data["statistics"].tobytes().decode("utf-8"))
+        return words, segments, statistics, text_segments
+
+    with open(input_path, "rb") as f:
+        data = json.loads(f.read().decode("utf-8"))
+    words = WordColumns(
+        TextColumn.from_strings(data["words"]["text"]),
+        data["words"]["start_time"],
+        data["words"]["end_time"],
+    )
+    segments = SegmentColumns(
+        TextColumn.from_strings(data["segments"]["text"]),
+        data["segments"]["word_start"],
+        data["segments"]["word_end"],
+        data["segments"]["match_score"],
+    )
+    return words, segments, data["statistics"], data["text_segments"]
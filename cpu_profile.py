@@ -0,0 +1,87 @@
+"""
+CPU 推理配置：自动选择精度、设置线程数以及 int8 动态量化
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DTYPES = ("auto", "float32", "bfloat16")
+
+
+def benchmark_dtype(dtype, size: int = 512, repeat: int = 5):
+    """测量指定精度下矩阵乘法的平均耗时（秒）"""
+    import torch
+
+    a = torch.randn(size, size).to(dtype)
+    b = torch.randn(size, size).to(dtype)
+    with torch.inference_mode():
+        # 预热，避免把首次调用的初始化开销计入
+        torch.matmul(a, b)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            torch.matmul(a, b)
+        return (time.perf_counter() - start) / repeat
+
+
+def pick_cpu_dtype():
+    """比较 float32 与 bfloat16 的矩阵乘法速度，返回 (较快的精度名, 各精度耗时)"""
+    import torch
+
+    timings = {}
+    for name in ("float32", "bfloat16"):
+        try:
+            timings[name] = benchmark_dtype(getattr(torch, name))
+        except RuntimeError:
+            # 部分 CPU 后端不支持 bfloat16 矩阵乘法
+            continue
+    # 不支持 AMX/AVX512-BF16 的 CPU 上 bfloat16 往往明显慢于 float32
+    return min(timings, key=timings.get), timings
+
+
+def resolve_dtype(dtype: str, device: str):
+    """把配置的精度名解析为实际使用的精度名"""
+    if dtype != "auto":
+        return dtype
+    if device.startswith("cuda"):
+        return "bfloat16"
+    chosen, timings = pick_cpu_dtype()
+    logger.info(
+        "精度测速: "
+        + ", ".join(f"{name} {t * 1000:.2f}ms" for name, t in timings.items())
+        + f"，选择 {chosen}"
+    )
+    return chosen
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """设置 PyTorch 的算子内与算子间线程数，返回实际生效的线程数"""
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # 算子间线程池在首次并行计算后不能再修改
+            logger.warning(f"无法设置算子间线程数: {e}")
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def quantize_linear_layers(aligner):
+    """对对齐器内部模型的 Linear 层做 int8 动态量化，返回量化的层数"""
+    import torch
+
+    module = getattr(aligner, "model", aligner)
+    if not isinstance(module, torch.nn.Module):
+        raise TypeError(f"无法量化的模型类型: {type(module)}")
+
+    count = sum(1 for m in module.modules() if isinstance(m, torch.nn.Linear))
+    quantized = torch.ao.quantization.quantize_dynamic(
+        module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    if module is not aligner:
+        aligner.model = quantized
+    return count
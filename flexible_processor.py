@@ -1,241 +1,898 @@
 import json
+import logging
 import os
-import re
-import subprocess
-from datetime import timedelta
+import threading
 from pathlib import Path
 
-import torch
-from qwen_asr import Qwen3ForcedAligner
+from alignment_cache import DEFAULT_MAX_BYTES, AlignmentCache, alignment_key
+from audio_io import SAMPLE_RATE, decode_audio, get_duration
+from checkpoint import JobCheckpoint
+from columnar import SegmentColumns, WordColumns, save_compact_json, save_npz
+from cpu_profile import DTYPES, configure_threads, quantize_linear_layers, resolve_dtype
+from incremental import load_previous_result, realign_edits
+from instrumentation import StageMetrics, write_metrics
+from job_result import JobResult
+from long_audio import align_long_audio
+from matching import HIGH_MATCH_SCORE, MATCH_MODES, monotonic_match
+from refine import refine_weak_segments
+from sharded import ShardedAligner, default_threads_per_worker
+from subtitle_writer import (
+    DEFAULT_SUBTITLE_FORMATS,
+    SUBTITLE_FORMATS,
+    write_subtitles,
+)
+from text_stream import iter_file_segments, iter_segments
+from vad import trim_silence
+from waveform_cache import DEFAULT_WAVEFORM_CACHE_BYTES, WaveformCache
+from word_index import WordIndex
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".aac", ".ogg", ".flac"}
+RESULT_FORMATS = ("json", "compact", "npz")
+
+# 解码与对齐完成时报告的进度（占音频总时长的比例），匹配与写出完成后报告全部进度
+STAGE_PROGRESS = {"decode": 0.05, "align": 0.9}
+
+# 任务处理器从原处理器复制的配置
+JOB_SETTINGS = (
+    "split_mode",
+    "custom_punctuation",
+    "max_segment_length",
+    "match_mode",
+    "long_audio_window",
+    "long_audio_overlap",
+    "result_format",
+    "subtitle_formats",
+    "cache",
+    "waveform_cache",
+    "dtype",
+    "intra_op_threads",
+    "inter_op_threads",
+    "quantize",
+    "vad",
+    "shard_workers",
+    "shard_margin",
+    "shard_aligner_factory",
+    "refinement",
+    "work_dir",
+    "progress_callback",
+)
 
 
 class FlexibleTextTimestampProcessor:
-    def __init__(self, model_name="Qwen/Qwen3-ForcedAligner-0.6B"):
-        """初始化灵活的文本时间戳处理器"""
-        self.model = None
+    def __init__(self, model_name="Qwen/Qwen3-ForcedAligner-0.6B", aligner=None):
+        """初始化灵活的文本时间戳处理器
+
+        aligner 可传入已加载的对齐器（或离线测试用的桩对齐器），此时不再加载模型。
+        """
+        self.model = aligner
         self.model_name = model_name
+        # 由 new_job 创建的任务处理器指向持有模型的处理器
+        self.parent = None
+        self.model_lock = threading.Lock()
+        # 模型调用不可重入，多个任务共享同一把推理锁
+        self.inference_lock = threading.Lock()
         self.text_segments = []
+        # 文本段在原文中的字符区间，与 text_segments 一一对应
+        self.text_spans = []
         self.word_timestamps = []
+        self.word_index = None
         self.matched_segments = []
 
         # 默认使用标点分割
         self.split_mode = "punctuation"
         self.custom_punctuation = "、。！？"
+        # 文本段长度上限（字符数），为 None 时不限制
+        self.max_segment_length = None
+
+        # 默认使用单调线性匹配，legacy 为旧版穷举匹配
+        self.match_mode = "monotonic"
+
+        # 长音频分窗对齐，窗口长度为 0 表示整段对齐
+        self.long_audio_window = 0
+        self.long_audio_overlap = 30.0
+
+        # 结果文件格式：json（完整 JSON）、compact（紧凑 JSON）或 npz
+        self.result_format = "json"
+
+        # 写出的字幕格式，以及最近一次写出的 {格式: 路径}
+        self.subtitle_formats = DEFAULT_SUBTITLE_FORMATS
+        self.subtitle_outputs = {}
+
+        # 分阶段计时与内存统计，每次处理时重置
+        self.metrics = StageMetrics()
+
+        # 对齐结果缓存与解码波形缓存，默认关闭
+        self.cache = None
+        self.waveform_cache = None
+
+        # 推理配置：精度（auto 在 CPU 上按测速结果选择）、线程数与 int8 动态量化
+        self.dtype = "auto"
+        self.intra_op_threads = None
+        self.inter_op_threads = None
+        self.quantize = False
+        self.inference_config = {}
+        # dtype 为 auto 时解析出的精度，模型加载前计算缓存键时也会用到
+        self.auto_dtype = None
+
+        # 静音压缩（语音活动检测），默认关闭
+        self.vad = None
+
+        # 多进程分片对齐，进程数为 0 表示在本进程内对齐
+        self.shard_workers = 0
+        self.shard_margin = 10.0
+        self.shard_aligner_factory = None
+        self.sharded_aligner = None
+
+        # 低分文本段的二次对齐，默认关闭
+        self.refinement = None
+
+        # 检查点目录（为 None 时不保存检查点）与进度回调 callback(已处理秒数, 总秒数)
+        self.work_dir = None
+        self.progress_callback = None
+        self.last_progress = None
 
     def load_model(self):
-        """加载ASR模型"""
-        if self.model is None:
-            print(f"正在加载模型: {self.model_name}")
-            self.model = Qwen3ForcedAligner.from_pretrained(
-                self.model_name,
-                dtype=torch.bfloat16,
-                device_map="cpu" if not torch.cuda.is_available() else "cuda:0",
-            )
-            print("模型加载完成")
+        """加载ASR模型（多个线程同时调用时只加载一次）"""
+        if self.parent is not None:
+            # 任务处理器使用原处理器的模型
+            if self.parent.model is None:
+                with self.metrics.stage("load_model"):
+                    self.parent.load_model()
+            self.model = self.parent.model
+            self.inference_config = self.parent.inference_config
+            return
+
+        with self.model_lock:
+            if self.model is None:
+                import torch
+                from qwen_asr import Qwen3ForcedAligner
+
+                logger.info(f"正在加载模型: {self.model_name}")
+                with self.metrics.stage("load_model"):
+                    # int8 动态量化的算子只有 CPU 实现
+                    use_cuda = torch.cuda.is_available() and not self.quantize
+                    device = "cuda:0" if use_cuda else "cpu"
+                    threads = configure_threads(
+                        self.intra_op_threads, self.inter_op_threads
+                    )
+                    dtype = self.model_dtype()
+                    self.model = Qwen3ForcedAligner.from_pretrained(
+                        self.model_name,
+                        dtype=getattr(torch, dtype),
+                        device_map=device,
+                    )
+                    quantized_layers = 0
+                    if self.quantize:
+                        quantized_layers = quantize_linear_layers(self.model)
+
+                self.inference_config = {
+                    "device": device,
+                    "dtype": dtype,
+                    "intra_op_threads": threads[0],
+                    "inter_op_threads": threads[1],
+                    "quantized_linear_layers": quantized_layers,
+                }
+                summary = f"设备 {device}，精度 {dtype}，线程 {threads[0]}/{threads[1]}"
+                if self.quantize:
+                    summary += f"，int8 量化 {quantized_layers} 个 Linear 层"
+                logger.info(f"模型加载完成（{summary}）")
+
+    def new_job(self):
+        """创建任务处理器：共享模型、推理锁与分片进程池，复制当前配置，中间结果独立保存
+
+        process 每次调用都在新的任务处理器上执行，因此同一个处理器可以连续处理多个文件，
+        也可以在多个线程中同时处理，任务之间不会互相影响。
+        """
+        root = self.parent or self
+        job = FlexibleTextTimestampProcessor(root.model_name, aligner=root.model)
+        job.parent = root
+        job.inference_lock = root.inference_lock
+        job.inference_config = root.inference_config
+        for name in JOB_SETTINGS:
+            setattr(job, name, getattr(self, name))
+        return job
 
     def set_custom_punctuation(self, custom_punctuation: str):
         """设置自定义分割标点"""
         self.custom_punctuation = custom_punctuation
-        print(f"使用标点: {self.custom_punctuation}")
-        print(f"分割模式: 标点分割")
-
-    def split_text_by_punctuation(self, text: str):
-        """按自定义标点符号分割文本"""
-        pattern = f"([{re.escape(self.custom_punctuation)}])"
-        text_with_separator = re.sub(pattern, r"\1|", text)
-        segments = [
-            item.strip() for item in text_with_separator.split("|") if item.strip()
-        ]
-
-        self.text_segments = segments
-        print(f"标点符号分割完成，共 {len(self.text_segments)} 段")
-        print(f"使用标点: {self.custom_punctuation}")
+        logger.info(f"使用标点: {self.custom_punctuation}")
+        logger.info(f"分割模式: 标点分割")
+
+    def set_max_segment_length(self, max_length: int = None):
+        """设置文本段长度上限（字符数），超长的文本段优先在空白或逗号处继续切分"""
+        if max_length is not None and max_length <= 0:
+            raise ValueError("文本段长度上限必须大于 0")
+        self.max_segment_length = max_length
+        if max_length:
+            logger.info(f"文本段长度上限: {max_length} 字符")
+
+    def split_text_by_punctuation(self, text: str, path=None):
+        """按自定义标点符号分割文本，同时记录每个文本段的字符区间
+
+        path 为文本读取自的文件时分块流式读取该文件分割，偏移与 text 一致。
+        """
+        if path is not None:
+            pieces = iter_file_segments(
+                path, self.custom_punctuation, self.max_segment_length
+            )
+        else:
+            pieces = iter_segments(
+                text, self.custom_punctuation, self.max_segment_length
+            )
+        self.text_segments = []
+        self.text_spans = []
+        for segment, start, end in pieces:
+            self.text_segments.append(segment)
+            self.text_spans.append((start, end))
+        logger.info(f"标点符号分割完成，共 {len(self.text_segments)} 段")
+        logger.info(f"使用标点: {self.custom_punctuation}")
         return self.text_segments
 
-    def split_text(self, text: str):
+    def split_text(self, text: str, path=None):
         """使用标点分割模式分割文本"""
-        return self.split_text_by_punctuation(text)
+        return self.split_text_by_punctuation(text, path)
 
-    def get_word_timestamps(
-        self, text: str, audio_path: str, language: str = "Japanese"
+    def segment_spans(self):
+        """当前文本段的字符区间；文本段不是由 split_text 得到时返回 None"""
+        if len(self.text_spans) != len(self.text_segments):
+            return None
+        return self.text_spans
+
+    def set_cpu_profile(
+        self,
+        dtype: str = "auto",
+        intra_op_threads: int = None,
+        inter_op_threads: int = None,
+        quantize: bool = False,
     ):
-        """获取字词级时间戳"""
-        self.load_model()
+        """设置推理配置，需在加载模型之前调用
+
+        dtype 为 auto 时，GPU 使用 bfloat16，CPU 在启动时比较 float32 与 bfloat16 的速度后选择。
+        quantize 为 True 时以 float32 加载模型，并对 Linear 层做 int8 动态量化（仅 CPU）。
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"不支持的精度: {dtype}，可选: {', '.join(DTYPES)}")
+        for name, value in (
+            ("intra_op_threads", intra_op_threads),
+            ("inter_op_threads", inter_op_threads),
+        ):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} 必须大于 0")
+        if quantize and dtype == "bfloat16":
+            raise ValueError("int8 动态量化需要 float32 模型")
+        self.dtype = dtype
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.quantize = quantize
+
+    def model_dtype(self):
+        """模型实际使用的精度名
+
+        模型加载前按当前配置解析：auto 在 GPU 上为 bfloat16，在 CPU 上测速选择，
+        结果保存在原处理器上，加载模型时直接使用。传入的对齐器返回配置的精度。
+        """
+        if self.inference_config:
+            return self.inference_config["dtype"]
+        # 动态量化只支持 float32 模型
+        if self.quantize:
+            return "float32"
+        if self.dtype != "auto" or self.model is not None:
+            return self.dtype
+        root = self.parent or self
+        if root.auto_dtype is None:
+            import torch
+
+            device = "cuda:0" if torch.cuda.is_available() else "cpu"
+            root.auto_dtype = resolve_dtype("auto", device)
+        return root.auto_dtype
+
+    def set_vad(
+        self,
+        enabled: bool = True,
+        threshold_db: float = -35.0,
+        min_silence: float = 1.0,
+        keep_silence: float = 0.3,
+    ):
+        """设置对齐前的静音压缩
+
+        能量低于较响部分 threshold_db 分贝、且长于 min_silence 秒的片段压缩为 keep_silence 秒，
+        对齐结果会映射回原始时间轴。只作用于解码后的波形。
+        """
+        if not enabled:
+            self.vad = None
+            logger.info("静音压缩: 关闭")
+            return
+        if threshold_db >= 0:
+            raise ValueError("静音阈值必须为负的分贝值")
+        if keep_silence < 0 or min_silence <= keep_silence:
+            raise ValueError("最短静音时长必须大于保留的静音时长，且保留时长不能为负")
+        self.vad = {
+            "threshold_db": threshold_db,
+            "min_silence": min_silence,
+            "keep_silence": keep_silence,
+        }
+        logger.info(
+            f"静音压缩: 阈值 {threshold_db}dB，最短静音 {min_silence}s，"
+            f"保留 {keep_silence}s"
+        )
 
-        print(f"正在处理音频: {audio_path}")
-        print(f"文本长度: {len(text)} 字符")
+    def compress_silence(self, audio):
+        """按静音压缩设置处理解码后的波形，返回 (音频, TimeMap 或 None)"""
+        if self.vad is None or not isinstance(audio, tuple):
+            return audio, None
+        waveform, sample_rate = audio
+        # 在对齐调用内执行，耗时计入 align 阶段
+        waveform, time_map = trim_silence(
+            waveform,
+            sample_rate,
+            threshold_db=self.vad["threshold_db"],
+            min_silence=self.vad["min_silence"],
+            keep=self.vad["keep_silence"],
+        )
+        removed = self.metrics.values.get("vad_removed_seconds", 0.0)
+        self.metrics.set(
+            "vad_removed_seconds", round(removed + time_map.removed_seconds, 3)
+        )
+        total = time_map.removed_seconds + len(waveform) / sample_rate
+        if total > 0:
+            logger.info(
+                f"静音压缩: 移除 {time_map.removed_seconds:.1f}s / {total:.1f}s"
+                f"（{time_map.removed_seconds / total:.0%}）"
+            )
+        return (waveform, sample_rate), time_map
 
-        try:
+    def set_refinement(
+        self,
+        enabled: bool = True,
+        threshold: float = HIGH_MATCH_SCORE,
+        max_window_sec: float = 600.0,
+    ):
+        """设置匹配后的二次对齐
+
+        得分低于 threshold 或未匹配的文本段，以两侧高分文本段为边界截取音频，
+        只用这些文本段的文本重新对齐；超过 max_window_sec 秒的区间不处理。
+        """
+        if not enabled:
+            self.refinement = None
+            logger.info("二次对齐: 关闭")
+            return
+        if not 0 < threshold <= 1:
+            raise ValueError("二次对齐的得分阈值必须在 (0, 1] 范围内")
+        if max_window_sec <= 0:
+            raise ValueError("二次对齐的最大区间长度必须大于 0")
+        self.refinement = {"threshold": threshold, "max_window_sec": max_window_sec}
+        logger.info(f"二次对齐: 得分阈值 {threshold}，最大区间 {max_window_sec}s")
+
+    def set_checkpoint_dir(self, work_dir):
+        """设置检查点目录（None 为关闭）
+
+        长音频分窗对齐时每个窗口对齐后保存一次检查点，各阶段完成后保存阶段结果；
+        相同输入的任务中断后重新运行时从最后一个检查点继续，任务完成后删除检查点。
+        """
+        self.work_dir = str(work_dir) if work_dir else None
+        if self.work_dir:
+            Path(self.work_dir).mkdir(parents=True, exist_ok=True)
+            logger.info(f"检查点目录: {self.work_dir}")
+
+    def set_progress_callback(self, callback):
+        """设置进度回调 callback(已处理的音频秒数, 音频总秒数)，None 为关闭"""
+        self.progress_callback = callback
+
+    def report_progress(self, done: float, total: float):
+        if self.progress_callback is None:
+            return
+        done = min(done, total)
+        # 与上次相同的进度不再重复报告
+        if (done, total) == self.last_progress:
+            return
+        self.last_progress = (done, total)
+        self.progress_callback(done, total)
+
+    def report_stage(self, stage: str, duration: float):
+        """某一阶段完成时按 STAGE_PROGRESS 报告进度"""
+        self.report_progress(duration * STAGE_PROGRESS[stage], duration)
+
+    def finish_progress(self):
+        """匹配与写出完成后报告全部进度（之前报告过进度时）"""
+        if self.last_progress is not None:
+            total = self.last_progress[1]
+            self.report_progress(total, total)
+
+    def set_long_audio_mode(self, window_sec: float = 300.0, overlap_sec: float = 30.0):
+        """启用长音频分窗对齐（window_sec 为 0 时关闭）"""
+        self.long_audio_window = window_sec
+        self.long_audio_overlap = overlap_sec
+        if window_sec:
+            logger.info(f"长音频分窗对齐: 窗口 {window_sec}s，重叠 {overlap_sec}s")
+
+    def set_shard_mode(
+        self, workers: int, margin_sec: float = 10.0, aligner_factory=None
+    ):
+        """启用多进程分片对齐（workers 为 0 或 1 时关闭）
+
+        每个工作进程加载一份模型，未设置算子内线程数时平均分配 CPU 核心。
+        aligner_factory 可传入可序列化的对齐器工厂（如离线测试用的 StubForcedAligner），
+        默认在每个进程中按 model_name 加载模型。
+        """
+        if workers < 0 or margin_sec < 0:
+            raise ValueError("分片进程数与分片音频余量不能为负")
+        self.close_shards()
+        self.shard_workers = workers if workers > 1 else 0
+        self.shard_margin = margin_sec
+        self.shard_aligner_factory = aligner_factory
+        if self.shard_workers:
+            logger.info(
+                f"分片对齐: {self.shard_workers} 个进程，音频余量 {margin_sec}s"
+            )
+
+    def get_sharded_aligner(self):
+        """按当前推理配置创建（或复用）分片对齐的进程池"""
+        if self.parent is not None:
+            return self.parent.get_sharded_aligner()
+        with self.model_lock:
+            if self.sharded_aligner is None:
+                settings = {
+                    "model_name": self.model_name,
+                    "aligner_factory": self.shard_aligner_factory,
+                    # 各工作进程使用与缓存键一致的精度，不再各自测速
+                    "dtype": self.model_dtype(),
+                    "intra_op_threads": self.intra_op_threads
+                    or default_threads_per_worker(self.shard_workers),
+                    "inter_op_threads": self.inter_op_threads,
+                    "quantize": self.quantize,
+                    "vad": self.vad,
+                }
+                self.sharded_aligner = ShardedAligner(
+                    settings, self.shard_workers, self.shard_margin
+                )
+                self.sharded_aligner.start()
+        return self.sharded_aligner
+
+    def close_shards(self):
+        """关闭分片对齐的工作进程"""
+        if self.sharded_aligner is not None:
+            self.sharded_aligner.close()
+            self.sharded_aligner = None
+
+    def align_words(self, audio, text: str, language: str):
+        """调用对齐模型，返回字词时间戳列表"""
+        self.load_model()
+        audio, time_map = self.compress_silence(audio)
+
+        with self.inference_lock:
             results = self.model.align(
-                audio=audio_path,
+                audio=audio,
                 text=text,
                 language=language,
             )
 
-            self.word_timestamps = [
+        word_timestamps = [
+            {
+                "text": item.text,
+                "start_time": item.start_time,
+                "end_time": item.end_time,
+            }
+            for item in results[0]
+        ]
+        if time_map is not None:
+            time_map.remap_words(word_timestamps)
+        return word_timestamps
+
+    def align_words_batch(self, audios, texts, language: str):
+        """一次调用对齐模型处理多组音频与文本，返回每组的字词时间戳列表"""
+        self.load_model()
+        audios, time_maps = zip(*[self.compress_silence(audio) for audio in audios])
+
+        with self.inference_lock:
+            results = self.model.align(
+                audio=list(audios),
+                text=list(texts),
+                language=[language] * len(texts),
+            )
+
+        batch_words = []
+        for result, time_map in zip(results, time_maps):
+            word_timestamps = [
                 {
                     "text": item.text,
                     "start_time": item.start_time,
                     "end_time": item.end_time,
                 }
-                for item in results[0]
+                for item in result
             ]
+            if time_map is not None:
+                time_map.remap_words(word_timestamps)
+            batch_words.append(word_timestamps)
+        return batch_words
+
+    def enable_cache(self, cache_dir=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """启用对齐结果缓存，相同音频、文本、模型与语言不再重复对齐"""
+        self.cache = AlignmentCache(cache_dir, max_bytes)
+        logger.info(f"对齐缓存目录: {self.cache.cache_dir}")
+        return self.cache
+
+    def disable_cache(self):
+        """关闭对齐结果缓存"""
+        self.cache = None
+
+    def enable_waveform_cache(
+        self, cache_dir=None, max_bytes: int = DEFAULT_WAVEFORM_CACHE_BYTES
+    ):
+        """启用解码波形缓存，同一媒体文件只解码一次，之后以内存映射方式读取"""
+        self.waveform_cache = WaveformCache(cache_dir, max_bytes)
+        logger.info(f"波形缓存目录: {self.waveform_cache.cache_dir}")
+        return self.waveform_cache
+
+    def disable_waveform_cache(self):
+        """关闭解码波形缓存"""
+        self.waveform_cache = None
+
+    def alignment_cache_key(self, audio, text: str, language: str, windowed=None):
+        """计算对齐结果的缓存键，windowed 默认取决于是否启用了长音频分窗对齐"""
+        options = self.alignment_options(windowed)
+        return self.cache.make_key(audio, text, self.model_name, language, **options)
+
+    def alignment_options(self, windowed=None):
+        """影响对齐结果的参数，用于缓存键与检查点键"""
+        if windowed is None:
+            windowed = bool(self.long_audio_window)
+        # 精度不同时对齐结果略有差异
+        options = {"dtype": self.model_dtype()}
+        if self.quantize:
+            # 量化后的模型输出与原模型略有差异
+            options["quantize"] = "int8"
+        if self.vad is not None:
+            options["vad"] = self.vad
+        if self.shard_workers and not windowed:
+            # 分片边界影响对齐结果
+            options["shards"] = [self.shard_workers, self.shard_margin]
+        if windowed:
+            # 分窗对齐以标点分割段为边界，结果与窗口参数和标点有关
+            options.update(
+                {
+                    "long_audio_window": self.long_audio_window,
+                    "long_audio_overlap": self.long_audio_overlap,
+                    "punctuation": self.custom_punctuation,
+                }
+            )
+            if self.max_segment_length:
+                options["max_segment_length"] = self.max_segment_length
+        return options
+
+    def open_checkpoint(self, audio_path: str, text: str, language: str):
+        """打开（或创建）与本次输入对应的任务检查点"""
+        options = self.alignment_options()
+        if self.refinement:
+            options["refinement"] = self.refinement
+        key = alignment_key(audio_path, text, self.model_name, language, **options)
+        return JobCheckpoint(self.work_dir, key)
+
+    def run_stage(self, checkpoint, stage: str, func):
+        """执行产生字词时间戳的阶段，返回是否实际执行
+
+        检查点中已有该阶段的结果时直接读取，否则执行 func 并保存阶段结果。
+        """
+        if checkpoint is not None and checkpoint.has_stage(stage):
+            self.word_timestamps = checkpoint.load_stage(stage)
+            logger.info(
+                f"从检查点读取 {stage} 阶段结果，共 {len(self.word_timestamps)} 个词"
+            )
+            self.build_word_index()
+            return False
+        func()
+        if checkpoint is not None:
+            checkpoint.save_stage(stage, self.word_timestamps)
+        return True
+
+    def get_word_timestamps(
+        self, text: str, audio_path: str, language: str = "Japanese", checkpoint=None
+    ):
+        """获取字词级时间戳
+
+        checkpoint 为 JobCheckpoint 时，长音频分窗对齐从已保存的窗口继续，并在每个窗口后保存。
+        """
+        logger.info(f"正在处理音频: {audio_path}")
+        logger.info(f"文本长度: {len(text)} 字符")
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.alignment_cache_key(audio_path, text, language)
+            cached = self.cache.get(cache_key)
+            self.metrics.set("cache_hit", cached is not None)
+            if cached is not None:
+                self.word_timestamps = cached
+                logger.info(f"命中对齐缓存，共 {len(self.word_timestamps)} 个词")
+                self.build_word_index()
+                return self.word_timestamps
+
+        if not self.shard_workers or self.long_audio_window:
+            self.load_model()
+
+        try:
+            if self.long_audio_window:
+                if not self.text_segments:
+                    self.split_text(text)
+                self.metrics.set("audio_duration", get_duration(audio_path))
+                resume = checkpoint.resume_point() if checkpoint else None
+
+                def on_window(words, next_segment, next_start, duration):
+                    if checkpoint is not None:
+                        checkpoint.save_chunk(words, next_segment, next_start)
+                    self.report_progress(next_start * STAGE_PROGRESS["align"], duration)
+
+                with self.metrics.stage("align"):
+                    self.word_timestamps = align_long_audio(
+                        self.align_words,
+                        audio_path,
+                        text,
+                        self.text_segments,
+                        language,
+                        self.custom_punctuation,
+                        spans=self.segment_spans(),
+                        window_sec=self.long_audio_window,
+                        overlap_sec=self.long_audio_overlap,
+                        resume=resume,
+                        on_window=on_window,
+                    )
+            else:
+                audio = audio_path
+                if isinstance(audio, (str, Path)):
+                    audio = self.load_audio(audio)
+                duration = len(audio[0]) / audio[1]
+                self.report_stage("decode", duration)
+                with self.metrics.stage("align"):
+                    if self.shard_workers:
+                        if not self.text_segments:
+                            self.split_text(text)
+                        self.word_timestamps = self.get_sharded_aligner().align(
+                            audio[0],
+                            audio[1],
+                            text,
+                            self.text_segments,
+                            language,
+                            self.custom_punctuation,
+                            spans=self.segment_spans(),
+                        )
+                    else:
+                        self.word_timestamps = self.align_words(audio, text, language)
+                self.report_stage("align", duration)
 
-            print(f"字词时间戳获取完成，共 {len(self.word_timestamps)} 个词")
+            logger.info(f"字词时间戳获取完成，共 {len(self.word_timestamps)} 个词")
+            if cache_key is not None:
+                self.cache.put(cache_key, self.word_timestamps)
+            self.build_word_index()
             return self.word_timestamps
 
         except Exception as e:
-            print(f"获取时间戳失败: {e}")
+            logger.error(f"获取时间戳失败: {e}")
             raise
 
-    def optimized_matching(self):
-        """优化的匹配算法"""
-        if not self.text_segments or not self.word_timestamps:
-            raise ValueError("请先运行文本分割和字词时间戳获取")
-
-        print("正在执行优化匹配...")
-
-        used_word_indices = set()
-
-        for segment in self.text_segments:
-            target_clean = re.sub(
-                f"[{re.escape(self.custom_punctuation)}\\s]", "", segment
-            ).lower()
+    def realign_incremental(
+        self, previous_result, text: str, audio_path: str, language: str = "Japanese"
+    ):
+        """基于上次的结果文件增量获取字词时间戳：只重新对齐修改过的文本段附近的音频"""
+        logger.info(f"增量对齐，上次结果: {previous_result}")
+        if not isinstance(audio_path, (str, Path)):
+            raise ValueError("增量对齐需要媒体文件路径")
+        if not self.text_segments:
+            self.split_text(text)
 
-            best_match = None
-            best_score = 0
-            best_start_idx = 0
-            best_end_idx = 0
+        previous_segments, previous_words = load_previous_result(previous_result)
+        with self.metrics.stage("align"):
+            self.word_timestamps, stats = realign_edits(
+                self.align_words,
+                str(audio_path),
+                text,
+                self.text_segments,
+                previous_segments,
+                previous_words,
+                language,
+                self.custom_punctuation,
+                spans=self.segment_spans(),
+            )
+        self.metrics.set("incremental", stats)
+        logger.info(
+            f"增量对齐完成：改动 {stats['changed_segments']} 个文本段，"
+            f"重新对齐 {stats['realigned_windows']} 个区间，"
+            f"共 {stats['realigned_seconds']:.1f}s 音频"
+        )
+        self.build_word_index()
+        return self.word_timestamps
 
-            for start_idx in range(len(self.word_timestamps)):
-                if start_idx in used_word_indices:
-                    continue
+    def refine_alignment(self, text: str, audio, language: str = "Japanese"):
+        """对低分或未匹配的文本段做二次对齐，有改进时重新匹配"""
+        if not self.matched_segments:
+            self.optimized_matching()
+        if isinstance(audio, Path):
+            audio = str(audio)
+
+        with self.metrics.stage("refine"):
+            matched_segments = self.matched_segments
+            if self.match_mode != "monotonic":
+                # 二次对齐按文本顺序确定区间边界，旧版匹配的字词区间不保证单调
+                matched_segments = monotonic_match(
+                    self.text_segments,
+                    self.word_timestamps,
+                    self.custom_punctuation,
+                )
+            words, stats = refine_weak_segments(
+                self.align_words,
+                audio,
+                text,
+                self.text_segments,
+                matched_segments,
+                self.word_timestamps,
+                language,
+                self.custom_punctuation,
+                threshold=self.refinement["threshold"],
+                max_window_sec=self.refinement["max_window_sec"],
+                spans=self.segment_spans(),
+            )
+        self.metrics.set("refine", stats)
+        logger.info(
+            f"二次对齐完成：低分文本段 {stats['weak_segments']} 个，"
+            f"重新对齐 {stats['refined_windows']} 个区间"
+            f"（{stats['refined_seconds']:.1f}s 音频），"
+            f"改进 {stats['improved_segments']} 个文本段"
+        )
+        if stats["replaced_windows"]:
+            self.word_timestamps = words
+            self.build_word_index()
+            self.optimized_matching()
+        return self.matched_segments
 
-                for end_idx in range(
-                    start_idx + 1, min(start_idx + 30, len(self.word_timestamps) + 1)
-                ):
-                    overlap = any(
-                        idx in used_word_indices for idx in range(start_idx, end_idx)
-                    )
-                    if overlap:
-                        continue
+    def build_word_index(self):
+        """构建字词时间戳的字符偏移索引，供匹配算法复用"""
+        self.word_index = WordIndex(
+            self.word_timestamps,
+            self.custom_punctuation,
+            strip_symbols=self.match_mode != "legacy",
+        )
+        return self.word_index
 
-                    candidate_words = self.word_timestamps[start_idx:end_idx]
-                    candidate_text = "".join([w["text"] for w in candidate_words])
-                    candidate_clean = re.sub(
-                        f"[{re.escape(self.custom_punctuation)}\\s]", "", candidate_text
-                    ).lower()
-
-                    if target_clean == candidate_clean:
-                        score = 1.0
-                    elif target_clean in candidate_clean:
-                        score = len(target_clean) / len(candidate_clean)
-                    elif candidate_clean in target_clean:
-                        score = len(candidate_clean) / len(target_clean)
-                    else:
-                        common_chars = set(target_clean) & set(candidate_clean)
-                        score = (
-                            len(common_chars) / len(target_clean) if target_clean else 0
-                        )
+    def set_match_mode(self, match_mode: str):
+        """设置匹配算法：monotonic（单调线性匹配）或 legacy（旧版穷举匹配）"""
+        if match_mode not in MATCH_MODES:
+            raise ValueError(
+                f"不支持的匹配模式: {match_mode}，可选: {', '.join(MATCH_MODES)}"
+            )
+        self.match_mode = match_mode
+        logger.info(f"匹配模式: {self.match_mode}")
 
-                    if score > best_score and score > 0.4:
-                        best_score = score
-                        best_match = candidate_words
-                        best_start_idx = start_idx
-                        best_end_idx = end_idx
-
-            if best_match:
-                for idx in range(best_start_idx, best_end_idx):
-                    used_word_indices.add(idx)
-
-                start_time = best_match[0]["start_time"]
-                end_time = best_match[-1]["end_time"]
-
-                self.matched_segments.append(
-                    {
-                        "text": segment,
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "words": best_match,
-                        "match_score": best_score,
-                        "segment_type": "sentence",
-                    }
-                )
+    def optimized_matching(self):
+        """优化的匹配算法"""
+        if not self.text_segments or not self.word_timestamps:
+            raise ValueError("请先运行文本分割和字词时间戳获取")
 
-        self.matched_segments.sort(key=lambda x: x["start_time"])
+        logger.info(f"正在执行优化匹配（{self.match_mode}）...")
+
+        strip_symbols = self.match_mode != "legacy"
+        if (
+            self.word_index is None
+            or len(self.word_index) != len(self.word_timestamps)
+            or not self.word_index.matches(self.custom_punctuation, strip_symbols)
+        ):
+            self.build_word_index()
+
+        match_func = MATCH_MODES[self.match_mode]
+        with self.metrics.stage("matching"):
+            self.matched_segments = match_func(
+                self.text_segments,
+                self.word_timestamps,
+                self.custom_punctuation,
+                index=self.word_index,
+            )
 
-        print(f"优化匹配完成，共 {len(self.matched_segments)} 个文本段")
-        high_quality = sum(1 for s in self.matched_segments if s["match_score"] > 0.8)
-        print(f"高质量匹配: {high_quality}/{len(self.matched_segments)}")
+        logger.info(f"优化匹配完成，共 {len(self.matched_segments)} 个文本段")
+        high_quality = sum(
+            1 for s in self.matched_segments if s["match_score"] > HIGH_MATCH_SCORE
+        )
+        logger.info(f"高质量匹配: {high_quality}/{len(self.matched_segments)}")
 
         return self.matched_segments
 
     def format_time(self, seconds: float):
-        """将秒数转换为SRT时间格式"""
-        td = timedelta(seconds=seconds)
-        hours, remainder = divmod(td.total_seconds(), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        milliseconds = int((seconds - int(seconds)) * 1000)
-        seconds = int(seconds)
-
-        return (
-            f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d},{milliseconds:03d}"
-        )
+        """将秒数转换为SRT时间格式（单个时间戳；批量格式化见 subtitle_writer.format_clock）"""
+        milliseconds = max(round(seconds * 1000), 0)
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
     def generate_word_srt(self, output_path: str):
         """生成字词级SRT字幕文件"""
-        print(f"正在生成字词级SRT文件: {output_path}")
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            word_index = 1
-            for word_info in self.word_timestamps:
-                start_time = self.format_time(word_info["start_time"])
-                end_time = self.format_time(word_info["end_time"])
-                text = word_info["text"]
-
-                if text.strip():
-                    f.write(f"{word_index}\n")
-                    f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{text}\n\n")
-                    word_index += 1
-
-        print(f"字词级SRT文件生成完成: {output_path}")
+        logger.info(f"正在生成字词级SRT文件: {output_path}")
+        write_subtitles(
+            {"word_srt": output_path}, self.word_timestamps, self.matched_segments
+        )
+        logger.info(f"字词级SRT文件生成完成: {output_path}")
         return output_path
 
     def generate_sentence_srt(self, output_path: str):
         """生成句级SRT字幕文件"""
-        print(f"正在生成句级SRT文件: {output_path}")
+        logger.info(f"正在生成句级SRT文件: {output_path}")
+        write_subtitles(
+            {"sentence_srt": output_path}, self.word_timestamps, self.matched_segments
+        )
+        logger.info(f"句级SRT文件生成完成: {output_path}")
+        return output_path
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            for i, segment in enumerate(self.matched_segments, 1):
-                start_time = self.format_time(segment["start_time"])
-                end_time = self.format_time(segment["end_time"])
-                text = segment["text"]
+    def set_subtitle_formats(self, formats):
+        """设置写出的字幕格式：word_srt、sentence_srt、vtt、ass、tsv 的任意组合"""
+        formats = set(formats)
+        unknown = formats - set(SUBTITLE_FORMATS)
+        if unknown:
+            raise ValueError(
+                f"不支持的字幕格式: {', '.join(sorted(unknown))}，"
+                f"可选: {', '.join(SUBTITLE_FORMATS)}"
+            )
+        self.subtitle_formats = tuple(f for f in SUBTITLE_FORMATS if f in formats)
+        logger.info(f"字幕格式: {', '.join(self.subtitle_formats) or '无'}")
+
+    def build_statistics(self):
+        """汇总结果文件中的统计信息"""
+        return {
+            "total_segments": len(self.text_segments),
+            "total_words": len(self.word_timestamps),
+            "matched_segments": len(self.matched_segments),
+            "total_duration": max(w["end_time"] for w in self.word_timestamps)
+            if self.word_timestamps
+            else 0,
+            "split_mode": self.split_mode,
+            "punctuation_used": self.custom_punctuation
+            if self.split_mode == "punctuation"
+            else None,
+        }
 
-                if text.strip():
-                    f.write(f"{i}\n")
-                    f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{text}\n\n")
+    def set_result_format(self, result_format: str):
+        """设置结果文件格式：json（完整 JSON）、compact（紧凑 JSON）或 npz"""
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(
+                f"不支持的结果格式: {result_format}，可选: {', '.join(RESULT_FORMATS)}"
+            )
+        self.result_format = result_format
+        logger.info(f"结果格式: {self.result_format}")
+
+    def save_result(self, output_path: str = "result.json"):
+        """按当前结果格式保存结果文件，返回实际写出的路径"""
+        if self.result_format == "compact":
+            return self.save_result_compact(output_path)
+        if self.result_format == "npz":
+            return self.save_result_npz(str(Path(output_path).with_suffix(".npz")))
+        return self.save_result_json(output_path)
+
+    def save_result_compact(self, output_path: str = "result.json"):
+        """保存紧凑 JSON：字词只保存一次，文本段以字词下标区间引用"""
+        words = WordColumns.from_word_timestamps(self.word_timestamps)
+        segments = SegmentColumns.from_matched_segments(
+            self.matched_segments, self.word_timestamps
+        )
+        save_compact_json(
+            output_path, words, segments, self.build_statistics(), self.text_segments
+        )
+        logger.info(f"紧凑JSON文件保存完成: {output_path}")
+        return output_path
 
-        print(f"句级SRT文件生成完成: {output_path}")
+    def save_result_npz(self, output_path: str = "result.npz"):
+        """保存为 NumPy .npz 列式结果文件"""
+        words = WordColumns.from_word_timestamps(self.word_timestamps)
+        segments = SegmentColumns.from_matched_segments(
+            self.matched_segments, self.word_timestamps
+        )
+        save_npz(
+            output_path, words, segments, self.build_statistics(), self.text_segments
+        )
+        logger.info(f"NPZ结果文件保存完成: {output_path}")
         return output_path
 
     def save_result_json(self, output_path: str = "result.json"):
         """保存结果为JSON文件（格式类似final_matched_timestamps.json）"""
         result_data = {
             "segments": self.matched_segments,
-            "statistics": {
-                "total_segments": len(self.text_segments),
-                "total_words": len(self.word_timestamps),
-                "matched_segments": len(self.matched_segments),
-                "total_duration": max(w["end_time"] for w in self.word_timestamps)
-                if self.word_timestamps
-                else 0,
-                "split_mode": self.split_mode,
-                "punctuation_used": self.custom_punctuation
-                if self.split_mode == "punctuation"
-                else None,
-            },
+            "statistics": self.build_statistics(),
             "raw_data": {
                 "text_segments": self.text_segments,
                 "word_timestamps": self.word_timestamps,
@@ -245,7 +902,7 @@ class FlexibleTextTimestampProcessor:
         with open(output_path, "w", encoding="utf-8") as f:
             json.dump(result_data, f, ensure_ascii=False, indent=2)
 
-        print(f"结果JSON文件保存完成: {output_path}")
+        logger.info(f"结果JSON文件保存完成: {output_path}")
         return output_path
 
     def get_output_filename(self, audio_path, suffix: str):
@@ -253,94 +910,44 @@ class FlexibleTextTimestampProcessor:
         audio_filename = Path(audio_path).stem
         return f"{audio_filename}{suffix}"
 
+    def text_file_path(self, text_input):
+        """文本输入为文件路径时返回该路径，直接输入的文本返回 None"""
+        text_input = str(text_input)
+        return text_input if os.path.isfile(text_input) else None
+
     def load_text(self, text_input):
         """加载文本内容，支持直接文本或文件路径"""
         if isinstance(text_input, Path):
             text_input = str(text_input)
 
-        if os.path.isfile(text_input):
-            print(f"正在读取文本文件: {text_input}")
+        if self.text_file_path(text_input):
+            logger.info(f"正在读取文本文件: {text_input}")
             try:
                 with open(text_input, "r", encoding="utf-8") as f:
                     text = f.read()
-                print(f"文本文件读取完成，长度: {len(text)} 字符")
+                logger.info(f"文本文件读取完成，长度: {len(text)} 字符")
                 return text
             except Exception as e:
-                print(f"读取文本文件失败: {e}")
+                logger.error(f"读取文本文件失败: {e}")
                 raise
         else:
-            print(f"使用直接输入文本，长度: {len(text_input)} 字符")
+            logger.info(f"使用直接输入文本，长度: {len(text_input)} 字符")
             return text_input
 
-    def process_video_file(self, video_path):
-        """处理视频文件（先转换为音频）"""
-        video_path = str(video_path)
-
-        if not os.path.isfile(video_path):
-            print(f"[ERROR] 视频文件不存在: {video_path}")
-            return None
-
-        video_ext = Path(video_path).suffix.lower()
-        print(f"[INFO] 检测到视频文件: {video_path}")
-
-        try:
-            video_path_no_ext = (
-                video_path[: -len(video_ext)] if video_ext else video_path
-            )
-            temp_audio_path = f"{video_path_no_ext}_temp_audio.mp3"
-
-            print(f"[INFO] 开始转换视频为音频: {video_path} -> {temp_audio_path}")
-
-            if video_ext in [".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"]:
-                cmd = [
-                    "ffmpeg",
-                    "-i",
-                    video_path,
-                    "-vn",
-                    "-acodec",
-                    "mp3",
-                    "-ar",
-                    "44100",
-                    "-ab",
-                    "128k",
-                    "-y",
-                    temp_audio_path,
-                ]
-
-                print(f"[INFO] 执行转换命令: {' '.join(cmd)}")
-
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    encoding="utf-8",
-                    errors="replace",
+    def load_audio(self, media_path):
+        """把音频或视频文件解码为模型采样率的单声道波形，返回 (波形, 采样率)"""
+        media_path = str(media_path)
+        logger.info(f"正在解码音频: {media_path}")
+        with self.metrics.stage("decode"):
+            if self.waveform_cache is not None:
+                waveform = self.waveform_cache.load(
+                    media_path, SAMPLE_RATE, decode_audio
                 )
-
-                if result.returncode == 0:
-                    print(f"[INFO] 视频转换完成: {temp_audio_path}")
-
-                    try:
-                        os.remove(video_path)
-                        print(f"[INFO] 已删除原始视频文件: {video_path}")
-                    except Exception as e:
-                        print(f"[WARNING] 删除视频文件失败: {e}")
-
-                    return temp_audio_path
-                else:
-                    print(f"[ERROR] 视频转换失败:")
-                    print(result.stderr)
-                    return None
             else:
-                print(f"[ERROR] 不支持的视频格式: {video_ext}")
-                print(
-                    f"[INFO] 支持的格式: {', '.join(['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm'])}"
-                )
-                return None
-
-        except Exception as e:
-            print(f"[ERROR] 视频转换失败: {e}")
-            return None
+                waveform = decode_audio(media_path, SAMPLE_RATE)
+        self.metrics.set("audio_duration", round(len(waveform) / SAMPLE_RATE, 3))
+        logger.info(f"解码完成，时长: {len(waveform) / SAMPLE_RATE:.1f}s")
+        return waveform, SAMPLE_RATE
 
     def process_media_file(self, media_path, text_input, **kwargs):
         """处理媒体文件（自动检测视频或音频）"""
@@ -348,18 +955,16 @@ class FlexibleTextTimestampProcessor:
         media_ext = Path(media_path).suffix.lower()
 
         if not os.path.isfile(media_path):
-            print(f"[ERROR] 媒体文件不存在: {media_path}")
+            logger.error(f"媒体文件不存在: {media_path}")
             return None
 
-        video_extensions = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
-        audio_extensions = {".mp3", ".wav", ".m4a", ".aac", ".ogg", ".flac"}
+        video_extensions = VIDEO_EXTENSIONS
+        audio_extensions = AUDIO_EXTENSIONS
 
-        if media_ext in video_extensions:
-            print(f"[INFO] 检测到视频文件: {media_path}")
-            return self.process_video_file(media_path)
-        elif media_ext in audio_extensions:
-            print(f"[INFO] 检测到音频文件: {media_path}")
-            # 直接使用音频文件处理
+        if media_ext in video_extensions or media_ext in audio_extensions:
+            media_type = "视频" if media_ext in video_extensions else "音频"
+            logger.info(f"检测到{media_type}文件: {media_path}")
+            # 音频和视频使用同一解码路径
             media_stem = Path(media_path).stem
             json_output = kwargs.get("json_output", f"{media_stem}.json")
             word_srt_output = kwargs.get("word_srt_output", f"{media_stem}_word.srt")
@@ -381,11 +986,63 @@ class FlexibleTextTimestampProcessor:
                 },
             )
         else:
-            print(f"[ERROR] 不支持的媒体格式: {media_ext}")
-            print(f"[INFO] 支持的视频格式: {', '.join(video_extensions)}")
-            print(f"[INFO] 支持的音频格式: {', '.join(audio_extensions)}")
+            logger.error(f"不支持的媒体格式: {media_ext}")
+            logger.info(f"支持的视频格式: {', '.join(video_extensions)}")
+            logger.info(f"支持的音频格式: {', '.join(audio_extensions)}")
             return None
 
+    def write_outputs(self, json_output, word_srt_output, sentence_srt_output):
+        """写出结果文件与字幕文件，返回实际写出的 (结果文件, 字词级SRT, 句级SRT) 路径
+
+        字幕按 subtitle_formats 一次写出；SRT 以外的格式与结果文件同名、换用对应后缀。
+        未写出的 SRT 对应的路径为 None，全部字幕路径保存在 subtitle_outputs 中。
+        """
+        outputs = {}
+        for name in self.subtitle_formats:
+            if name == "word_srt":
+                outputs[name] = word_srt_output
+            elif name == "sentence_srt":
+                outputs[name] = sentence_srt_output
+            else:
+                outputs[name] = str(
+                    Path(json_output).with_suffix(SUBTITLE_FORMATS[name])
+                )
+
+        with self.metrics.stage("write_result"):
+            json_output = self.save_result(json_output)
+        with self.metrics.stage("write_subtitles"):
+            logger.info(f"正在写出字幕: {', '.join(outputs) or '无'}")
+            self.subtitle_outputs = write_subtitles(
+                outputs, self.word_timestamps, self.matched_segments
+            )
+        return (
+            json_output,
+            self.subtitle_outputs.get("word_srt"),
+            self.subtitle_outputs.get("sentence_srt"),
+        )
+
+    def collect_performance(self, metrics_output=None, media_path=None):
+        """汇总本次处理的分阶段统计，并按需写入统计文件"""
+        self.metrics.set("word_count", len(self.word_timestamps))
+        self.metrics.set("segment_count", len(self.text_segments))
+        self.metrics.set("matched_segment_count", len(self.matched_segments))
+        if self.inference_config:
+            self.metrics.set("inference", self.inference_config)
+        performance = self.metrics.to_dict()
+
+        stages = ", ".join(
+            f"{name} {stage['wall_time']:.2f}s"
+            for name, stage in performance["stages"].items()
+        )
+        logger.info(f"阶段耗时: {stages}")
+        if "real_time_factor" in performance:
+            logger.info(f"实时率: {performance['real_time_factor']:.1f}x")
+
+        if metrics_output:
+            labels = {"media": str(media_path)} if media_path else {}
+            write_metrics(metrics_output, performance, labels)
+        return performance
+
     def process(
         self,
         text_input,
@@ -394,14 +1051,47 @@ class FlexibleTextTimestampProcessor:
         json_output=None,
         word_srt_output=None,
         sentence_srt_output=None,
+        metrics_output=None,
+        previous_result=None,
     ):
-        """完整处理流程"""
-        print("=" * 60)
-        print("开始灵活文本时间戳处理")
-        print("=" * 60)
+        """完整处理流程，返回只读的 JobResult
+
+        metrics_output 指定时把分阶段统计写入该文件（.prom 为 Prometheus 文本格式，
+        其他为追加的 JSON 行）。previous_result 指定同一媒体上次的结果文件时，
+        只重新对齐修改过的文本段。
+        处理在 new_job() 创建的任务处理器上执行，不修改本处理器的状态，可在多个线程中同时调用。
+        """
+        return self.new_job().run(
+            text_input,
+            audio_path,
+            language,
+            json_output,
+            word_srt_output,
+            sentence_srt_output,
+            metrics_output,
+            previous_result,
+        )
 
+    def run(
+        self,
+        text_input,
+        audio_path,
+        language="Japanese",
+        json_output=None,
+        word_srt_output=None,
+        sentence_srt_output=None,
+        metrics_output=None,
+        previous_result=None,
+    ):
+        """在本处理器上执行完整处理流程，中间结果保存在本处理器上"""
+        logger.info("=" * 60)
+        logger.info("开始灵活文本时间戳处理")
+        logger.info("=" * 60)
+
+        self.metrics = StageMetrics()
         try:
-            text = self.load_text(text_input)
+            with self.metrics.stage("load_text"):
+                text = self.load_text(text_input)
 
             if isinstance(audio_path, Path):
                 audio_path = str(audio_path)
@@ -415,37 +1105,252 @@ class FlexibleTextTimestampProcessor:
                     audio_path, "_sentence.srt"
                 )
 
-            self.split_text(text)
-            self.get_word_timestamps(text, audio_path, language)
+            with self.metrics.stage("split_text"):
+                self.split_text(text, self.text_file_path(text_input))
+
+            checkpoint = None
+            if self.work_dir and not previous_result and isinstance(audio_path, str):
+                checkpoint = self.open_checkpoint(audio_path, text, language)
+
+            if previous_result:
+                self.realign_incremental(previous_result, text, audio_path, language)
+            else:
+                self.run_stage(
+                    checkpoint,
+                    "align",
+                    lambda: self.get_word_timestamps(
+                        text, audio_path, language, checkpoint
+                    ),
+                )
             self.optimized_matching()
-            self.save_result_json(json_output)
-            self.generate_word_srt(word_srt_output)
-            self.generate_sentence_srt(sentence_srt_output)
-
-            print("=" * 60)
-            print("灵活处理完成！")
-            print(f"JSON文件: {json_output}")
-            print(f"字词级SRT: {word_srt_output}")
-            print(f"句级SRT: {sentence_srt_output}")
-            print("=" * 60)
-
-            return {
-                "segments": self.matched_segments,
-                "statistics": {
-                    "total_segments": len(self.text_segments),
-                    "total_words": len(self.word_timestamps),
-                    "matched_segments": len(self.matched_segments),
-                },
-                "output_files": {
+            if self.refinement:
+                refined = self.run_stage(
+                    checkpoint,
+                    "refine",
+                    lambda: self.refine_alignment(text, audio_path, language),
+                )
+                if not refined:
+                    self.optimized_matching()
+            json_output, word_srt_output, sentence_srt_output = self.write_outputs(
+                json_output, word_srt_output, sentence_srt_output
+            )
+            self.finish_progress()
+            if checkpoint is not None:
+                checkpoint.remove()
+            performance = self.collect_performance(metrics_output, audio_path)
+
+            logger.info("=" * 60)
+            logger.info("灵活处理完成！")
+            logger.info(f"JSON文件: {json_output}")
+            for name, path in self.subtitle_outputs.items():
+                logger.info(f"字幕 ({name}): {path}")
+            logger.info("=" * 60)
+
+            return self.job_result(
+                performance, json_output, word_srt_output, sentence_srt_output
+            )
+
+        except Exception as e:
+            logger.error(f"处理失败: {e}")
+            raise
+
+    def job_result(
+        self,
+        performance,
+        json_output,
+        word_srt_output,
+        sentence_srt_output,
+        media_path=None,
+    ):
+        """用本处理器上的中间结果创建只读的 JobResult"""
+        return JobResult(
+            segments=self.matched_segments,
+            text_segments=self.text_segments,
+            word_timestamps=self.word_timestamps,
+            statistics={
+                "total_segments": len(self.text_segments),
+                "total_words": len(self.word_timestamps),
+                "matched_segments": len(self.matched_segments),
+                "performance": performance,
+            },
+            output_files={
+                name: path
+                for name, path in {
                     "json": json_output,
                     "word_srt": word_srt_output,
                     "sentence_srt": sentence_srt_output,
-                },
-            }
+                    **self.subtitle_outputs,
+                }.items()
+                if path
+            },
+            media_path=media_path,
+        )
 
-        except Exception as e:
-            print(f"处理失败: {e}")
-            raise
+    def plan_batches(
+        self, durations, max_batch_size: int = 16, max_batch_duration: float = 600.0
+    ):
+        """按音频时长分组：时长相近的文件放在同一批，限制每批数量与总时长"""
+        order = sorted(range(len(durations)), key=lambda i: durations[i])
+        batches = []
+        current = []
+        current_duration = 0.0
+        for i in order:
+            if current and (
+                len(current) >= max_batch_size
+                or current_duration + durations[i] > max_batch_duration
+            ):
+                batches.append(current)
+                current = []
+                current_duration = 0.0
+            current.append(i)
+            current_duration += durations[i]
+        if current:
+            batches.append(current)
+        return batches
+
+    def process_batch(
+        self,
+        items,
+        language="Japanese",
+        output_dir=None,
+        max_batch_size: int = 16,
+        max_batch_duration: float = 600.0,
+    ):
+        """批量处理多组（媒体文件, 文本），按音频时长分批，每批只调用一次对齐模型
+
+        每组输入单独生成 JSON 与 SRT 文件，返回与输入顺序一致的结果列表；
+        处理失败的输入对应的结果包含 error 字段，不影响其他输入。
+        """
+        logger.info("=" * 60)
+        logger.info(f"开始批量处理，共 {len(items)} 个文件")
+        logger.info("=" * 60)
+
+        if output_dir is not None:
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        results = [None] * len(items)
+        jobs = []
+        for i, (media_path, text_input) in enumerate(items):
+            media_path = str(media_path)
+            try:
+                media_ext = Path(media_path).suffix.lower()
+                if not os.path.isfile(media_path):
+                    raise FileNotFoundError(f"媒体文件不存在: {media_path}")
+                if media_ext not in VIDEO_EXTENSIONS | AUDIO_EXTENSIONS:
+                    raise ValueError(f"不支持的媒体格式: {media_ext}")
+                audio_path = media_path
+
+                text = self.load_text(text_input)
+                splitter = self.new_job()
+                splitter.split_text(text, self.text_file_path(text_input))
+                job = {
+                    "index": i,
+                    "media_path": media_path,
+                    "audio_path": audio_path,
+                    "text": text,
+                    "text_segments": splitter.text_segments,
+                    "text_spans": splitter.text_spans,
+                    "cache_key": None,
+                }
+                if self.cache is not None:
+                    job["cache_key"] = self.alignment_cache_key(
+                        audio_path, text, language, windowed=False
+                    )
+                    cached = self.cache.get(job["cache_key"])
+                    if cached is not None:
+                        logger.info(f"命中对齐缓存: {media_path}")
+                        results[i] = self.finish_job(job, cached, output_dir, language)
+                        continue
+                job["duration"] = get_duration(audio_path)
+                jobs.append(job)
+            except Exception as e:
+                logger.error(f"准备失败: {media_path}: {e}")
+                results[i] = {"media_path": media_path, "error": str(e)}
+
+        batches = self.plan_batches(
+            [job["duration"] for job in jobs], max_batch_size, max_batch_duration
+        )
+        logger.info(f"共分为 {len(batches)} 批")
+
+        for batch_no, batch in enumerate(batches, 1):
+            batch_jobs = [jobs[i] for i in batch]
+            total_duration = sum(job["duration"] for job in batch_jobs)
+            logger.info(
+                f"正在对齐第 {batch_no}/{len(batches)} 批: "
+                f"{len(batch_jobs)} 个文件，共 {total_duration:.1f}s"
+            )
+
+            try:
+                # 每批解码一次，内存中只保留当前批次的波形
+                batch_words = self.align_words_batch(
+                    [self.load_audio(job["audio_path"]) for job in batch_jobs],
+                    [job["text"] for job in batch_jobs],
+                    language,
+                )
+            except Exception as e:
+                logger.error(f"第 {batch_no} 批对齐失败: {e}")
+                for job in batch_jobs:
+                    results[job["index"]] = {
+                        "media_path": job["media_path"],
+                        "error": str(e),
+                    }
+                continue
+
+            for job, words in zip(batch_jobs, batch_words):
+                if job["cache_key"] is not None:
+                    self.cache.put(job["cache_key"], words)
+                try:
+                    results[job["index"]] = self.finish_job(
+                        job, words, output_dir, language
+                    )
+                except Exception as e:
+                    logger.error(f"处理失败: {job['media_path']}: {e}")
+                    results[job["index"]] = {
+                        "media_path": job["media_path"],
+                        "error": str(e),
+                    }
+
+        succeeded = sum(1 for r in results if r and "error" not in r)
+        logger.info("=" * 60)
+        logger.info(f"批量处理完成: 成功 {succeeded}/{len(items)}")
+        logger.info("=" * 60)
+        return results
+
+    def finish_job(self, job, word_timestamps, output_dir, language=None):
+        """对一组输入的字词时间戳执行匹配并写出结果文件，在新的任务处理器上执行
+
+        启用二次对齐时需要传入 language，并在本进程中加载对齐模型。
+        """
+        processor = self.new_job()
+        processor.text_segments = job["text_segments"]
+        processor.text_spans = job.get("text_spans", [])
+        processor.word_timestamps = word_timestamps
+        processor.build_word_index()
+        processor.optimized_matching()
+        if processor.refinement:
+            if language is None:
+                raise ValueError("二次对齐需要指定语言")
+            processor.refine_alignment(job["text"], job["media_path"], language)
+
+        def output_path(suffix):
+            filename = processor.get_output_filename(job["media_path"], suffix)
+            return str(Path(output_dir) / filename) if output_dir else filename
+
+        json_output = output_path(".json")
+        word_srt_output = output_path("_word.srt")
+        sentence_srt_output = output_path("_sentence.srt")
+
+        json_output, word_srt_output, sentence_srt_output = processor.write_outputs(
+            json_output, word_srt_output, sentence_srt_output
+        )
+
+        return processor.job_result(
+            processor.collect_performance(),
+            json_output,
+            word_srt_output,
+            sentence_srt_output,
+            media_path=job["media_path"],
+        )
 
 
 def main():
@@ -476,4 +1381,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
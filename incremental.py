@@ -0,0 +1,162 @@
+"""
+增量重新对齐：文本修改后只重新对齐改动文本段附近的音频，其余字词沿用上次的时间戳
+"""
+
+import json
+import logging
+from difflib import SequenceMatcher
+
+from audio_io import SAMPLE_RATE, get_duration, load_audio_window
+from columnar import load_compact_result
+from long_audio import locate_segments
+from matching import monotonic_match
+
+logger = logging.getLogger(__name__)
+
+
+def load_previous_result(result_path):
+    """读取上次的结果文件，返回 (text_segments, word_timestamps)
+
+    支持 save_result_json 写出的完整 JSON，以及紧凑 JSON 与 .npz 结果。
+    """
+    if str(result_path).endswith(".npz"):
+        words, _, _, text_segments = load_compact_result(result_path)
+        return text_segments, words.to_word_timestamps()
+
+    with open(result_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format") == "compact":
+        words, _, _, text_segments = load_compact_result(result_path)
+        return text_segments, words.to_word_timestamps()
+    raw_data = data["raw_data"]
+    return raw_data["text_segments"], raw_data["word_timestamps"]
+
+
+def segment_word_ranges(text_segments, word_timestamps, punctuation):
+    """重新匹配上次的结果，返回每个文本段对应的字词下标区间（未匹配为 None）"""
+    matched = monotonic_match(text_segments, word_timestamps, punctuation)
+    position = {id(word): i for i, word in enumerate(word_timestamps)}
+
+    ranges = [None] * len(text_segments)
+    seg_idx = 0
+    # 匹配结果按文本顺序排列，是文本段的子序列
+    for segment in matched:
+        while (
+            seg_idx < len(text_segments) and text_segments[seg_idx] != segment["text"]
+        ):
+            seg_idx += 1
+        if seg_idx >= len(text_segments):
+            break
+        words = segment["words"]
+        ranges[seg_idx] = (position[id(words[0])], position[id(words[-1])] + 1)
+        seg_idx += 1
+    return ranges
+
+
+def realign_edits(
+    align_fn,
+    audio_path: str,
+    text: str,
+    segments,
+    previous_segments,
+    previous_words,
+    language: str,
+    punctuation: str,
+    context_segments: int = 1,
+    sample_rate: int = SAMPLE_RATE,
+    spans=None,
+):
+    """按文本修改增量更新字词时间戳，返回 (字词时间戳, 统计信息)
+
+    按文本段比较新旧文本，每组改动连同前后 context_segments 个未改动的文本段一起，
+    扩展到两侧锚点（最近的已匹配文本段），只解码锚点之间的音频并重新对齐，再把
+    新字词拼接进未改动部分的字词中。耗时与改动量成正比，与音频总长度无关。
+    spans 为分割时记录的新文本段字符区间，未提供时在 text 中重新定位。
+    """
+    ranges = segment_word_ranges(previous_segments, previous_words, punctuation)
+    if spans is None:
+        spans = locate_segments(text, segments)
+    matcher = SequenceMatcher(None, previous_segments, segments, autojunk=False)
+
+    # 每组改动扩展到两侧锚点（最近的已匹配文本段）之间：锚点与改动之间未匹配的
+    # 旧文本段没有可沿用的字词，需要一起重新对齐。扩展后重叠的窗口合并。
+    # 窗口：[旧文本段起点, 旧文本段终点, 新文本段起点, 新文本段终点]
+    windows = []
+    changed_segments = 0
+    for group in matcher.get_grouped_opcodes(context_segments):
+        if all(tag == "equal" for tag, *_ in group):
+            continue
+        changed_segments += sum(
+            max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in group if tag != "equal"
+        )
+        old_start, old_end = group[0][1], group[-1][2]
+        new_start, new_end = group[0][3], group[-1][4]
+        # 组外都是未改动的文本段，新旧下标一一对应
+        lo = next((i + 1 for i in range(old_start - 1, -1, -1) if ranges[i]), 0)
+        hi = next((i for i in range(old_end, len(ranges)) if ranges[i]), len(ranges))
+        new_lo = new_start - (old_start - lo)
+        new_hi = new_end + (hi - old_end)
+        if windows and lo <= windows[-1][1]:
+            windows[-1][1] = hi
+            windows[-1][3] = new_hi
+        else:
+            windows.append([lo, hi, new_lo, new_hi])
+
+    duration = None
+    words = []
+    cursor = 0
+    realigned_seconds = 0.0
+    realigned_windows = 0
+
+    for lo, hi, new_lo, new_hi in windows:
+        left_word = ranges[lo - 1][1] if lo else 0
+        right_word = ranges[hi][0] if hi < len(ranges) else len(previous_words)
+        left_word = max(left_word, cursor)
+        right_word = max(right_word, left_word)
+
+        if new_hi <= new_lo:
+            # 只删除了文本，去掉对应的旧字词即可
+            words.extend(previous_words[cursor:left_word])
+            cursor = right_word
+            continue
+
+        window_start = previous_words[left_word - 1]["end_time"] if left_word else 0.0
+        if right_word < len(previous_words):
+            window_end = previous_words[right_word]["start_time"]
+        else:
+            if duration is None:
+                duration = get_duration(audio_path)
+            window_end = duration
+        if window_end <= window_start:
+            # 锚点之间没有音频，保留原有字词
+            logger.warning(
+                f"文本段 {new_lo + 1}-{new_hi} 两侧锚点之间没有音频，沿用上次的时间戳"
+            )
+            continue
+
+        window_text = text[spans[new_lo][0] : spans[new_hi - 1][1]]
+        logger.info(
+            f"重新对齐 {window_start:.1f}s - {window_end:.1f}s，"
+            f"文本段 {new_lo + 1}-{new_hi}/{len(segments)}"
+        )
+        audio = load_audio_window(
+            audio_path, window_start, window_end - window_start, sample_rate
+        )
+        new_words = align_fn((audio, sample_rate), window_text, language)
+        del audio
+        for word in new_words:
+            word["start_time"] += window_start
+            word["end_time"] += window_start
+        words.extend(previous_words[cursor:left_word])
+        words.extend(new_words)
+        cursor = right_word
+        realigned_windows += 1
+        realigned_seconds += window_end - window_start
+
+    words.extend(previous_words[cursor:])
+    stats = {
+        "changed_segments": changed_segments,
+        "realigned_windows": realigned_windows,
+        "realigned_seconds": round(realigned_seconds, 3),
+    }
+    return words, stats
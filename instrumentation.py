@@ -0,0 +1,157 @@
+"""
+处理流程的分阶段计时、内存与实时率统计
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_bytes():
+    """当前进程此刻的常驻内存（字节），无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        # 未安装 psutil 时在 Linux 上读取 /proc
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """当前进程启动以来的峰值常驻内存（字节），无法获取时返回 None"""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以 KB 为单位
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+def to_megabytes(value):
+    return round(value / (1024 * 1024), 1)
+
+
+class StageMetrics:
+    """记录每个阶段的耗时与内存
+
+    每个阶段记录：
+    - rss_delta_mb：阶段开始到结束常驻内存的变化（多次执行时取最大值）
+    - rss_mb：阶段结束时的常驻内存
+    - process_peak_rss_mb：阶段结束时进程启动以来的峰值常驻内存，包含之前所有阶段
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.values = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """计时一个阶段；同名阶段多次执行时耗时累加"""
+        rss_start = current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, rss_start)
+
+    def record(self, name: str, wall_time: float, rss_start=None):
+        stage = self.stages.setdefault(name, {"wall_time": 0.0, "calls": 0})
+        stage["wall_time"] += wall_time
+        stage["calls"] += 1
+        rss = current_rss_bytes()
+        if rss is not None:
+            stage["rss_mb"] = to_megabytes(rss)
+            if rss_start is not None:
+                delta = to_megabytes(rss - rss_start)
+                stage["rss_delta_mb"] = max(stage.get("rss_delta_mb", delta), delta)
+        peak = peak_rss_bytes()
+        if peak is not None:
+            stage["process_peak_rss_mb"] = to_megabytes(peak)
+
+    def set(self, name: str, value):
+        self.values[name] = value
+
+    def to_dict(self):
+        """汇总为可写入结果 statistics 的字典"""
+        data = {
+            "stages": {
+                name: {**stage, "wall_time": round(stage["wall_time"], 4)}
+                for name, stage in self.stages.items()
+            },
+            **self.values,
+        }
+        data["total_time"] = round(
+            sum(stage["wall_time"] for stage in self.stages.values()), 4
+        )
+        align_time = self.stages.get("align", {}).get("wall_time")
+        audio_duration = self.values.get("audio_duration")
+        if align_time and audio_duration:
+            # 实时率：音频时长 ÷ 对齐耗时
+            data["real_time_factor"] = round(audio_duration / align_time, 3)
+        return data
+
+
+def write_metrics(output_path: str, metrics: dict, labels=None):
+    """写出统计信息：.prom 文件写为 Prometheus 文本格式，其他文件追加一行 JSON"""
+    labels = labels or {}
+    if str(output_path).endswith(".prom"):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(to_prometheus(metrics, labels))
+    else:
+        with open(output_path, "a", encoding="utf-8") as f:
+            record = {"timestamp": time.time(), "pid": os.getpid(), **labels, **metrics}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return output_path
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(metrics: dict, labels=None):
+    """转换为 Prometheus 文本格式"""
+
+    def format_labels(extra):
+        merged = {**(labels or {}), **extra}
+        if not merged:
+            return ""
+        pairs = ",".join(f'{k}="{_escape_label(v)}"' for k, v in merged.items())
+        return "{" + pairs + "}"
+
+    stages = metrics.get("stages", {})
+    lines = ["# TYPE aligner_stage_seconds gauge"]
+    for name, stage in stages.items():
+        lines.append(
+            f"aligner_stage_seconds{format_labels({'stage': name})} "
+            f"{stage['wall_time']}"
+        )
+    for key, metric in (
+        ("rss_delta_mb", "aligner_stage_rss_delta_megabytes"),
+        ("rss_mb", "aligner_stage_rss_megabytes"),
+        ("process_peak_rss_mb", "aligner_stage_process_peak_rss_megabytes"),
+    ):
+        lines.append(f"# TYPE {metric} gauge")
+        for name, stage in stages.items():
+            if key in stage:
+                lines.append(f"{metric}{format_labels({'stage': name})} {stage[key]}")
+    for key, value in metrics.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# TYPE aligner_{key} gauge")
+        lines.append(f"aligner_{key}{format_labels({})} {value}")
+    return "\n".join(lines) + "\n"
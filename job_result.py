@@ -0,0 +1,193 @@
+"""
+处理结果：每次处理返回一个只读的结果对象，任务之间不共享可变状态
+"""
+
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+
+from columnar import WordColumns
+
+
+def _freeze(value):
+    """递归转换为只读的映射代理与 tuple"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (tuple, list)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """把只读容器转换回可序列化的 dict / list"""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, (tuple, list, WordsView)):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class WordsView(Sequence):
+    """字词列的只读视图：取出字词时才创建只读映射，不为每个字词保存一份副本"""
+
+    __slots__ = ("columns", "start", "stop")
+
+    def __init__(self, columns: WordColumns, start: int = 0, stop: int = None):
+        self.columns = columns
+        self.start = start
+        self.stop = len(columns) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return tuple(self[j] for j in range(start, stop, step))
+            return WordsView(
+                self.columns, self.start + start, self.start + max(start, stop)
+            )
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("字词下标超出范围")
+        i += self.start
+        return MappingProxyType(
+            {
+                "text": self.columns.text[i],
+                "start_time": float(self.columns.start_times[i]),
+                "end_time": float(self.columns.end_times[i]),
+            }
+        )
+
+    def __iter__(self):
+        offsets = self.columns.text.offsets[self.start : self.stop + 1].tolist()
+        buffer = self.columns.text.buffer
+        for a, b, start, end in zip(
+            offsets,
+            offsets[1:],
+            self.columns.start_times[self.start : self.stop].tolist(),
+            self.columns.end_times[self.start : self.stop].tolist(),
+        ):
+            yield MappingProxyType(
+                {"text": buffer[a:b], "start_time": start, "end_time": end}
+            )
+
+    def __repr__(self):
+        return f"WordsView({len(self)} words)"
+
+
+class JobResult(Mapping):
+    """一次处理的只读结果
+
+    与旧版返回的 dict 兼容，可按 "segments"、"statistics"、"output_files"
+    （批量处理时还有 "media_path"）取值；也可通过同名属性访问，
+    并额外提供 text_segments 与 word_timestamps。所有容器均为只读的 tuple 或映射代理。
+
+    字词以列式（WordColumns）保存一次，word_timestamps 与文本段内的 words
+    都是其上的只读视图，访问时才创建单个字词的映射。
+    """
+
+    __slots__ = (
+        "segments",
+        "text_segments",
+        "word_timestamps",
+        "statistics",
+        "output_files",
+        "media_path",
+    )
+
+    def __init__(
+        self,
+        segments,
+        text_segments,
+        word_timestamps,
+        statistics,
+        output_files,
+        media_path=None,
+    ):
+        # 文本段内的 words 是 word_timestamps 的切片，按对象定位为同一列上的区间视图
+        if isinstance(word_timestamps, WordColumns):
+            columns = word_timestamps
+            position = {}
+        else:
+            columns = WordColumns.from_word_timestamps(word_timestamps)
+            position = {id(w): i for i, w in enumerate(word_timestamps)}
+
+        def freeze_words(words):
+            if isinstance(words, WordsView):
+                return words
+            if words and id(words[0]) in position and id(words[-1]) in position:
+                start = position[id(words[0])]
+                stop = position[id(words[-1])] + 1
+                if stop - start == len(words):
+                    return WordsView(columns, start, stop)
+            return tuple(_freeze(w) for w in words)
+
+        def freeze_segment(segment):
+            segment = dict(segment)
+            if "words" in segment:
+                segment["words"] = freeze_words(segment["words"])
+            return MappingProxyType(segment)
+
+        set_ = object.__setattr__
+        set_(self, "word_timestamps", WordsView(columns))
+        set_(self, "segments", tuple(freeze_segment(s) for s in segments))
+        set_(self, "text_segments", tuple(text_segments))
+        set_(self, "statistics", _freeze(statistics))
+        set_(self, "output_files", MappingProxyType(dict(output_files)))
+        set_(self, "media_path", media_path)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("JobResult 是只读对象")
+
+    def __delattr__(self, name):
+        raise AttributeError("JobResult 是只读对象")
+
+    def _keys(self):
+        keys = ("segments", "statistics", "output_files")
+        if self.media_path is not None:
+            keys = ("media_path",) + keys
+        return keys
+
+    def __getitem__(self, key):
+        if key not in self._keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return (
+            f"JobResult(segments={len(self.segments)}, "
+            f"words={len(self.word_timestamps)}, output_files={dict(self.output_files)})"
+        )
+
+    def __reduce__(self):
+        # 映射代理不能序列化，跨进程传递时按普通数据重建；
+        # 字词列与文本段内的视图引用同一个 WordColumns，只序列化一次
+        return (
+            JobResult,
+            (
+                [
+                    {
+                        k: v if isinstance(v, WordsView) else _thaw(v)
+                        for k, v in s.items()
+                    }
+                    for s in self.segments
+                ],
+                list(self.text_segments),
+                self.word_timestamps.columns,
+                _thaw(self.statistics),
+                dict(self.output_files),
+                self.media_path,
+            ),
+        )
+
+    def to_dict(self):
+        """转换为可 JSON 序列化的 dict（与旧版返回格式一致）"""
+        return {key: _thaw(getattr(self, key)) for key in self._keys()}
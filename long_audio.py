@@ -0,0 +1,136 @@
+"""
+长音频分窗对齐：按固定长度的重叠窗口逐段对齐，再拼接为全局时间轴
+"""
+
+import logging
+
+from audio_io import SAMPLE_RATE, get_duration, load_audio_window
+from matching import monotonic_match
+from word_index import WordIndex
+
+logger = logging.getLogger(__name__)
+
+# 分配给每个窗口的文本量相对于估算语速的余量
+TEXT_BUDGET_MARGIN = 1.2
+
+
+def locate_segments(text: str, segments):
+    """定位每个文本段在原文中的字符区间"""
+    spans = []
+    pos = 0
+    for segment in segments:
+        start = text.find(segment, pos)
+        if start < 0:
+            start = pos
+        end = start + len(segment)
+        spans.append((start, end))
+        pos = end
+    return spans
+
+
+def align_long_audio(
+    align_fn,
+    audio_path: str,
+    text: str,
+    segments,
+    language: str,
+    punctuation: str,
+    window_sec: float = 300.0,
+    overlap_sec: float = 30.0,
+    sample_rate: int = SAMPLE_RATE,
+    resume=None,
+    on_window=None,
+    spans=None,
+):
+    """分窗对齐长音频
+
+    align_fn(audio, text, language) 返回相对于传入音频的字词时间戳列表。
+    每个窗口长度为 window_sec + overlap_sec，按估算语速分配以标点分割段为边界的文本。
+    窗口对齐后，只保留结束时间落在前 window_sec 内的文本段，下一个窗口从最后
+    保留的文本段结束处开始；落在重叠区内的文本段交给下一个窗口重新对齐。
+    任意时刻只有一个窗口的音频在内存中，峰值内存与音频总长度无关。
+
+    resume 为 (已提交的字词, 下一个文本段下标, 下一个窗口起点) 时从该位置继续；
+    on_window(提交的字词, 下一个文本段下标, 下一个窗口起点, 音频总时长) 在每个窗口
+    提交后调用，用于保存检查点与报告进度。
+    spans 为分割时记录的文本段字符区间，未提供时在 text 中重新定位。
+    """
+    duration = get_duration(audio_path)
+    if spans is None:
+        spans = locate_segments(text, segments)
+    total_chars = sum(end - start for start, end in spans)
+    chars_per_sec = total_chars / duration if duration > 0 else float(total_chars)
+
+    word_timestamps, seg_idx, window_start = resume or ([], 0, 0.0)
+
+    while seg_idx < len(segments):
+        window_end = min(window_start + window_sec + overlap_sec, duration)
+        is_last = window_end >= duration
+
+        # 按估算语速分配文本，至少一段
+        seg_stop = seg_idx + 1
+        if is_last:
+            seg_stop = len(segments)
+        else:
+            budget = (window_end - window_start) * chars_per_sec * TEXT_BUDGET_MARGIN
+            used = spans[seg_idx][1] - spans[seg_idx][0]
+            while seg_stop < len(segments) and used < budget:
+                used += spans[seg_stop][1] - spans[seg_stop][0]
+                seg_stop += 1
+
+        window_text = text[spans[seg_idx][0] : spans[seg_stop - 1][1]]
+        logger.info(
+            f"正在对齐窗口 {window_start:.1f}s - {window_end:.1f}s，"
+            f"文本段 {seg_idx + 1}-{seg_stop}/{len(segments)}"
+        )
+
+        audio = load_audio_window(
+            audio_path, window_start, window_end - window_start, sample_rate
+        )
+        words = align_fn((audio, sample_rate), window_text, language)
+        del audio
+
+        for word in words:
+            word["start_time"] += window_start
+            word["end_time"] += window_start
+
+        window_segments = segments[seg_idx:seg_stop]
+        if is_last:
+            commit_count = len(window_segments)
+            commit_time = window_end
+        else:
+            # 确定可以提交的文本段：结束时间落在非重叠区内
+            matched = monotonic_match(window_segments, words, punctuation)
+            safe_end = window_start + window_sec
+
+            commit_count = 0
+            commit_time = None
+            position = 0
+            for match in matched:
+                # 单调匹配的结果按文本顺序排列，是 window_segments 的子序列
+                while window_segments[position] != match["text"]:
+                    position += 1
+                position += 1
+                if commit_time is not None and match["end_time"] > safe_end:
+                    break
+                # 保证前进：第一个匹配段即使落在重叠区内也提交
+                commit_count = position
+                commit_time = match["end_time"]
+
+            if commit_time is None:
+                # 整个窗口都没有可靠匹配，提交第一个文本段并跳过该窗口的前 window_sec 秒；
+                # 只保留第一个文本段对应的字词，其余文本交给下一个窗口
+                commit_count = 1
+                commit_time = safe_end
+                index = WordIndex(words, punctuation, strip_symbols=True)
+                target = index.clean(window_segments[0])
+                words = words[: index.word_at(len(target) - 1) + 1] if target else []
+
+        committed = [w for w in words if w["end_time"] <= commit_time]
+        word_timestamps.extend(committed)
+        seg_idx += commit_count
+        window_start = max(commit_time, window_start + 1.0 / sample_rate)
+        if on_window is not None:
+            on_window(committed, seg_idx, window_start, duration)
+
+    return word_timestamps
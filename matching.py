@@ -0,0 +1,224 @@
+"""
+文本段与字词时间戳的匹配算法
+"""
+
+from word_index import WordIndex
+
+# 低于该分数的匹配视为失败
+MIN_MATCH_SCORE = 0.4
+# 高质量匹配的得分线
+HIGH_MATCH_SCORE = 0.8
+# 跳过文本段后，模糊匹配起点范围最多后移的字符数
+MAX_SKIP_SLACK = 512
+
+
+def banded_search(target: str, stream: str, start: int, band: int, slack: int = 0):
+    """在 stream[start:] 中查找与 target 编辑距离最小的子串
+
+    半全局对齐：子串的起点不计代价，起点限制在 start 之后 slack + band 个字符内，
+    终点不计代价。动态规划只计算对角带 -band <= j - i <= slack + band 内的单元，
+    复杂度为 O(len(target) * (2 * band + slack))。返回 (起点, 终点, 距离)，
+    带内没有可行的对齐时终点等于起点。
+    """
+    m = len(target)
+    width = max(0, min(len(stream) - start, m + slack + band))
+    window = stream[start : start + width]
+    infinity = m + width + 1
+
+    # dist[j] / origin[j]：target 前 i 个字符对齐到以 window[j] 结尾时的距离与起点；
+    # 两行交替使用，带外相邻的单元置为无穷大，不需要每行重新初始化整行
+    previous_dist = [infinity] * (width + 2)
+    previous_origin = [0] * (width + 2)
+    current_dist = [infinity] * (width + 2)
+    current_origin = [0] * (width + 2)
+    for j in range(min(width, slack + band) + 1):
+        previous_dist[j] = 0
+        previous_origin[j] = j
+
+    low, high = 0, min(width, slack + band)
+    for i in range(1, m + 1):
+        low = max(0, i - band)
+        high = min(width, i + slack + band)
+        if low > high:
+            return start, start, m
+        ct = target[i - 1]
+        if low == 0:
+            current_dist[0] = i
+            current_origin[0] = 0
+            first = 1
+        else:
+            current_dist[low - 1] = infinity
+            first = low
+        for j in range(first, high + 1):
+            best = previous_dist[j - 1] + (ct != window[j - 1])
+            best_origin = previous_origin[j - 1]
+            if previous_dist[j] + 1 < best:
+                best = previous_dist[j] + 1
+                best_origin = previous_origin[j]
+            if current_dist[j - 1] + 1 < best:
+                best = current_dist[j - 1] + 1
+                best_origin = current_origin[j - 1]
+            current_dist[j] = best
+            current_origin[j] = best_origin
+        current_dist[high + 1] = infinity
+        previous_dist, current_dist = current_dist, previous_dist
+        previous_origin, current_origin = current_origin, previous_origin
+
+    best_end = min(
+        range(max(1, low), high + 1), key=lambda j: previous_dist[j], default=0
+    )
+    if not best_end:
+        return start, start, m
+    return (
+        start + previous_origin[best_end],
+        start + best_end,
+        previous_dist[best_end],
+    )
+
+
+def monotonic_match(
+    text_segments, word_timestamps, punctuation, index=None, band: int = 64
+):
+    """单调匹配：按文本顺序在清洗后的字符流上一次扫描完成匹配
+
+    对齐器按文本顺序返回字词，因此每个文本段只需从上一段的结束位置向后查找。
+    优先精确查找，失败时在有限窗口内做带状动态规划的模糊匹配，
+    得分由动态规划的编辑距离得出，不再对候选区间重新计算编辑距离。
+    """
+    if index is None or not index.matches(punctuation, strip_symbols=True):
+        index = WordIndex(word_timestamps, punctuation, strip_symbols=True)
+    stream = index.text
+
+    matched_segments = []
+    next_word = 0
+    # 上一段文本在字符流中的结束位置（可能落在某个字词内部）
+    text_cursor = 0
+    # 上次匹配成功后跳过的文本段的总长度：这些文本对应的字词仍在字符流中，
+    # 之后的查找窗口需要相应后移，否则一个较长的未匹配段会导致后续文本段全部失败
+    skipped = 0
+
+    for segment in text_segments:
+        target = index.clean(segment)
+        if not target or next_word >= len(index):
+            continue
+
+        cursor = min(text_cursor, index.char_start(next_word))
+        limit = min(len(stream), cursor + skipped + len(target) + band)
+
+        distance = 0
+        pos = stream.find(target, cursor, limit)
+        if pos >= 0:
+            span_start, span_end = pos, pos + len(target)
+        else:
+            # 模糊匹配的起点范围随跳过的文本后移，上限避免动态规划退化为整表计算
+            span_start, span_end, distance = banded_search(
+                target, stream, cursor, band, min(skipped, MAX_SKIP_SLACK)
+            )
+            if span_end <= span_start:
+                skipped += len(target)
+                continue
+
+        start_idx = max(index.word_at(span_start), next_word)
+        end_idx = max(index.word_at(span_end - 1) + 1, start_idx + 1)
+
+        if index.span_equals(start_idx, end_idx, target):
+            score = 1.0
+        else:
+            # 对齐到字词边界后多出或缺少的字符各计一次编辑，
+            # 包含关系时与 len(较短) / len(较长) 的得分一致
+            begin, end = index.char_span(start_idx, end_idx)
+            distance += abs(begin - span_start) + abs(end - span_end)
+            score = max(0.0, 1.0 - distance / max(len(target), end - begin))
+        if score <= MIN_MATCH_SCORE:
+            skipped += len(target)
+            continue
+
+        start_time, end_time = index.span_times(start_idx, end_idx)
+        matched_segments.append(
+            {
+                "text": segment,
+                "start_time": start_time,
+                "end_time": end_time,
+                "words": word_timestamps[start_idx:end_idx],
+                "match_score": score,
+                "segment_type": "sentence",
+            }
+        )
+        next_word = end_idx
+        text_cursor = span_end
+        skipped = 0
+
+    matched_segments.sort(key=lambda x: x["start_time"])
+    return matched_segments
+
+
+def legacy_match(
+    text_segments, word_timestamps, punctuation, index=None, max_words: int = 30
+):
+    """旧版穷举匹配算法，保留用于结果对比"""
+    if index is None or not index.matches(punctuation, strip_symbols=False):
+        index = WordIndex(word_timestamps, punctuation, strip_symbols=False)
+    matched_segments = []
+    used_word_indices = set()
+
+    for segment in text_segments:
+        target_clean = index.clean(segment)
+
+        best_score = 0
+        best_start_idx = 0
+        best_end_idx = 0
+
+        for start_idx in range(len(index)):
+            if start_idx in used_word_indices:
+                continue
+
+            for end_idx in range(
+                start_idx + 1, min(start_idx + max_words, len(index) + 1)
+            ):
+                overlap = any(
+                    idx in used_word_indices for idx in range(start_idx, end_idx)
+                )
+                if overlap:
+                    continue
+
+                candidate_clean = index.span_text(start_idx, end_idx)
+
+                if target_clean == candidate_clean:
+                    score = 1.0
+                elif target_clean in candidate_clean:
+                    score = len(target_clean) / len(candidate_clean)
+                elif candidate_clean in target_clean:
+                    score = len(candidate_clean) / len(target_clean)
+                else:
+                    common_chars = set(target_clean) & set(candidate_clean)
+                    score = len(common_chars) / len(target_clean) if target_clean else 0
+
+                if score > best_score and score > MIN_MATCH_SCORE:
+                    best_score = score
+                    best_start_idx = start_idx
+                    best_end_idx = end_idx
+
+        if best_score:
+            for idx in range(best_start_idx, best_end_idx):
+                used_word_indices.add(idx)
+
+            start_time, end_time = index.span_times(best_start_idx, best_end_idx)
+            matched_segments.append(
+                {
+                    "text": segment,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "words": word_timestamps[best_start_idx:best_end_idx],
+                    "match_score": best_score,
+                    "segment_type": "sentence",
+                }
+            )
+
+    matched_segments.sort(key=lambda x: x["start_time"])
+    return matched_segments
+
+
+MATCH_MODES = {
+    "monotonic": monotonic_match,
+    "legacy": legacy_match,
+}
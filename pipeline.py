@@ -0,0 +1,237 @@
+"""
+目录/清单流水线处理：解码与文本准备、模型推理、匹配与写出三个阶段并行
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from flexible_processor import (
+    AUDIO_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    FlexibleTextTimestampProcessor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def discover_jobs(media_dir, text_dir=None):
+    """在目录中查找媒体文件及同名的 .txt 文本文件"""
+    media_dir = Path(media_dir)
+    text_dir = Path(text_dir) if text_dir else media_dir
+    items = []
+    missing = []
+    for media_path in sorted(media_dir.iterdir()):
+        if media_path.suffix.lower() not in VIDEO_EXTENSIONS | AUDIO_EXTENSIONS:
+            continue
+        text_path = text_dir / f"{media_path.stem}.txt"
+        if text_path.is_file():
+            items.append((str(media_path), str(text_path)))
+        else:
+            missing.append(str(media_path))
+    return items, missing
+
+
+def prepare_job(index, media_path, text_input, settings):
+    """解码阶段（在进程池中运行）：解码音频、读取并分割文本
+
+    启用波形缓存时只返回缓存键，由推理进程以内存映射方式打开，
+    避免内存映射的波形在进程间传递时被序列化为一份完整的私有副本。
+    """
+    processor = FlexibleTextTimestampProcessor()
+    processor.custom_punctuation = settings["punctuation"]
+    processor.max_segment_length = settings["max_segment_length"]
+    processor.waveform_cache = settings["waveform_cache"]
+    text = processor.load_text(text_input)
+    processor.split_text(text, processor.text_file_path(text_input))
+    job = {
+        "index": index,
+        "media_path": media_path,
+        "text": text,
+        "text_segments": processor.text_segments,
+        "text_spans": processor.text_spans,
+    }
+    waveform, sample_rate = processor.load_audio(media_path)
+    if isinstance(waveform, np.memmap):
+        job["waveform_key"] = Path(waveform.filename).stem
+    else:
+        job["audio"] = (waveform, sample_rate)
+    return job
+
+
+def job_audio(processor, job):
+    """取出任务的波形：缓存的波形以只读内存映射方式打开，已被淘汰时重新解码"""
+    if "audio" in job:
+        return job.pop("audio")
+    waveform = processor.waveform_cache.get(job.pop("waveform_key"))
+    if waveform is None:
+        return processor.load_audio(job["media_path"])
+    return waveform, SAMPLE_RATE
+
+
+def write_job(job, word_timestamps, settings):
+    """写出阶段（在进程池中运行）：匹配并写出 JSON 与 SRT 文件"""
+    processor = FlexibleTextTimestampProcessor()
+    processor.custom_punctuation = settings["punctuation"]
+    processor.match_mode = settings["match_mode"]
+    processor.result_format = settings["result_format"]
+    processor.subtitle_formats = settings["subtitle_formats"]
+    return processor.finish_job(job, word_timestamps, settings["output_dir"])
+
+
+def run_pipeline(
+    processor: FlexibleTextTimestampProcessor,
+    items,
+    language="Japanese",
+    output_dir=None,
+    decode_workers: int = None,
+    writer_workers: int = None,
+    queue_size: int = 4,
+):
+    """以流水线方式处理多组（媒体文件, 文本）
+
+    解码进程池提前解码媒体并分割文本，当前进程作为唯一的推理进程依次调用对齐模型，
+    写出进程池执行匹配与文件写出。各阶段之间最多积压 queue_size 个任务，内存占用有上限。
+    单个文件失败只记录在对应结果的 error 字段中，不影响其他文件。
+    """
+    if processor.refinement:
+        raise ValueError("流水线处理不支持二次对齐，请使用按批处理（process_batch）")
+
+    cpu_count = os.cpu_count() or 2
+    decode_workers = decode_workers or max(1, cpu_count // 2)
+    writer_workers = writer_workers or max(1, cpu_count // 4)
+    if output_dir is not None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    settings = {
+        "punctuation": processor.custom_punctuation,
+        "max_segment_length": processor.max_segment_length,
+        "match_mode": processor.match_mode,
+        "result_format": processor.result_format,
+        "subtitle_formats": processor.subtitle_formats,
+        "waveform_cache": processor.waveform_cache,
+        "output_dir": output_dir,
+    }
+
+    logger.info("=" * 60)
+    logger.info(
+        f"开始流水线处理，共 {len(items)} 个文件"
+        f"（解码进程 {decode_workers}，写出进程 {writer_workers}）"
+    )
+    logger.info("=" * 60)
+
+    processor.load_model()
+    results = [None] * len(items)
+    writing = deque()
+
+    def record_error(index, stage, error):
+        media_path = str(items[index][0])
+        logger.error(f"{stage}失败: {media_path}: {error}")
+        results[index] = {"media_path": media_path, "error": str(error)}
+
+    def drain_writes(limit):
+        while len(writing) > limit:
+            index, future = writing.popleft()
+            try:
+                results[index] = future.result()
+                logger.info(f"处理完成: {results[index]['media_path']}")
+            except Exception as e:
+                record_error(index, "写出", e)
+
+    def lookup_cache(media_path, text_input):
+        """解码前查询对齐缓存，返回 (文本, 缓存键, 缓存的字词时间戳或 None)"""
+        text = processor.load_text(text_input)
+        cache_key = processor.alignment_cache_key(
+            media_path, text, language, windowed=False
+        )
+        return text, cache_key, processor.cache.get(cache_key)
+
+    with ProcessPoolExecutor(decode_workers) as decode_pool, ProcessPoolExecutor(
+        writer_workers
+    ) as writer_pool:
+        next_item = 0
+        decoding = deque()
+        cache_keys = {}
+
+        while next_item < len(items) or decoding:
+            # 保持解码队列填满，但最多提前 queue_size 个文件
+            while next_item < len(items) and len(decoding) < queue_size:
+                index = next_item
+                next_item += 1
+                media_path, text_input = items[index]
+                media_path = str(media_path)
+
+                # 解码前先查询对齐缓存，命中时不再解码，直接交给写出进程池
+                if processor.cache is not None:
+                    try:
+                        text, cache_key, cached = lookup_cache(media_path, text_input)
+                    except Exception as e:
+                        record_error(index, "准备", e)
+                        continue
+                    if cached is not None:
+                        logger.info(f"命中对齐缓存: {media_path}")
+                        splitter = processor.new_job()
+                        splitter.split_text(text, processor.text_file_path(text_input))
+                        job = {
+                            "index": index,
+                            "media_path": media_path,
+                            "text": text,
+                            "text_segments": splitter.text_segments,
+                            "text_spans": splitter.text_spans,
+                        }
+                        writing.append(
+                            (
+                                index,
+                                writer_pool.submit(write_job, job, cached, settings),
+                            )
+                        )
+                        drain_writes(queue_size)
+                        continue
+                    cache_keys[index] = cache_key
+
+                decoding.append(
+                    (
+                        index,
+                        decode_pool.submit(
+                            prepare_job, index, media_path, text_input, settings
+                        ),
+                    )
+                )
+
+            if not decoding:
+                continue
+            index, future = decoding.popleft()
+            try:
+                job = future.result()
+            except Exception as e:
+                record_error(index, "解码", e)
+                continue
+
+            cache_key = cache_keys.pop(index, None)
+            try:
+                audio = job_audio(processor, job)
+                word_timestamps = processor.align_words(audio, job["text"], language)
+                if cache_key is not None:
+                    processor.cache.put(cache_key, word_timestamps)
+                del audio
+            except Exception as e:
+                record_error(index, "对齐", e)
+                continue
+
+            writing.append(
+                (index, writer_pool.submit(write_job, job, word_timestamps, settings))
+            )
+            drain_writes(queue_size)
+
+        drain_writes(0)
+
+    succeeded = sum(1 for r in results if r and "error" not in r)
+    logger.info("=" * 60)
+    logger.info(f"流水线处理完成: 成功 {succeeded}/{len(items)}")
+    logger.info("=" * 60)
+    return results
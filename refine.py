@@ -0,0 +1,158 @@
+"""
+二次对齐：只对匹配失败或得分较低的文本段附近的音频重新对齐，其余字词保持不变
+"""
+
+import logging
+from pathlib import Path
+
+from audio_io import SAMPLE_RATE, get_duration, load_audio_window
+from long_audio import locate_segments
+from matching import monotonic_match
+
+logger = logging.getLogger(__name__)
+
+
+def assign_matches(text_segments, matched_segments, word_timestamps):
+    """把单调匹配的结果对应到文本段，返回每个文本段的 (得分, 字词起点, 字词终点)，未匹配为 None"""
+    position = {id(word): i for i, word in enumerate(word_timestamps)}
+    assigned = [None] * len(text_segments)
+    seg_idx = 0
+    # 匹配结果按开始时间排序；单调匹配的字词起点严格递增，按字词下标排序即为文本顺序，
+    # 是文本段的子序列
+    for segment in sorted(
+        matched_segments, key=lambda segment: position[id(segment["words"][0])]
+    ):
+        while (
+            seg_idx < len(text_segments) and text_segments[seg_idx] != segment["text"]
+        ):
+            seg_idx += 1
+        if seg_idx >= len(text_segments):
+            break
+        words = segment["words"]
+        assigned[seg_idx] = (
+            segment["match_score"],
+            position[id(words[0])],
+            position[id(words[-1])] + 1,
+        )
+        seg_idx += 1
+    return assigned
+
+
+def find_weak_runs(assigned, threshold: float):
+    """查找连续的低分或未匹配文本段，返回 [(起点, 终点)] 文本段下标区间"""
+    runs = []
+    start = None
+    for i, match in enumerate(assigned):
+        weak = match is None or match[0] < threshold
+        if weak and start is None:
+            start = i
+        elif not weak and start is not None:
+            runs.append((start, i))
+            start = None
+    if start is not None:
+        runs.append((start, len(assigned)))
+    return runs
+
+
+def load_window(audio, start: float, end: float, sample_rate: int):
+    """取出 [start, end) 区间的音频：媒体文件只解码该区间，解码后的波形直接切片"""
+    if isinstance(audio, (str, Path)):
+        return (
+            load_audio_window(str(audio), start, end - start, sample_rate),
+            sample_rate,
+        )
+    waveform, sample_rate = audio
+    return waveform[int(start * sample_rate) : int(end * sample_rate)], sample_rate
+
+
+def refine_weak_segments(
+    align_fn,
+    audio,
+    text: str,
+    segments,
+    matched_segments,
+    word_timestamps,
+    language: str,
+    punctuation: str,
+    threshold: float = 0.8,
+    max_window_sec: float = 600.0,
+    spans=None,
+):
+    """对低分或未匹配的文本段做二次对齐，返回 (字词时间戳, 统计信息)
+
+    连续的低分文本段合并为一个区间，以两侧最近的高分文本段（得分不低于 threshold）
+    为边界截取音频，只用这些文本段的文本重新对齐。新字词的匹配总分高于原字词时
+    才替换，否则保留原结果。超过 max_window_sec 秒的区间不处理。
+    spans 为分割时记录的文本段字符区间，未提供时在 text 中重新定位。
+    """
+    assigned = assign_matches(segments, matched_segments, word_timestamps)
+    runs = find_weak_runs(assigned, threshold)
+    if spans is None:
+        spans = locate_segments(text, segments)
+
+    duration = None
+    words = []
+    cursor = 0
+    stats = {
+        "weak_segments": sum(end - start for start, end in runs),
+        "refined_windows": 0,
+        "refined_seconds": 0.0,
+        "replaced_windows": 0,
+        "improved_segments": 0,
+    }
+
+    for run_start, run_end in runs:
+        # 边界：区间两侧最近的高分文本段，低分文本段的字词都落在边界之间
+        left = assigned[run_start - 1] if run_start > 0 else None
+        right = assigned[run_end] if run_end < len(assigned) else None
+        left_word = max(left[2] if left else 0, cursor)
+        right_word = max(right[1] if right else len(word_timestamps), left_word)
+
+        window_start = word_timestamps[left_word - 1]["end_time"] if left_word else 0.0
+        if right_word < len(word_timestamps):
+            window_end = word_timestamps[right_word]["start_time"]
+        else:
+            if duration is None:
+                duration = (
+                    get_duration(str(audio))
+                    if isinstance(audio, (str, Path))
+                    else len(audio[0]) / audio[1]
+                )
+            window_end = duration
+        if window_end <= window_start or window_end - window_start > max_window_sec:
+            continue
+
+        window_text = text[spans[run_start][0] : spans[run_end - 1][1]]
+        logger.info(
+            f"二次对齐 {window_start:.1f}s - {window_end:.1f}s，"
+            f"文本段 {run_start + 1}-{run_end}/{len(segments)}"
+        )
+        window_audio = load_window(audio, window_start, window_end, SAMPLE_RATE)
+        new_words = align_fn(window_audio, window_text, language)
+        del window_audio
+        for word in new_words:
+            word["start_time"] += window_start
+            word["end_time"] += window_start
+        stats["refined_windows"] += 1
+        stats["refined_seconds"] += window_end - window_start
+
+        # 只在新字词的匹配更好时替换
+        window_segments = segments[run_start:run_end]
+        old_score = sum(m[0] for m in assigned[run_start:run_end] if m is not None)
+        new_matches = monotonic_match(window_segments, new_words, punctuation)
+        new_score = sum(m["match_score"] for m in new_matches)
+        if new_score <= old_score:
+            continue
+
+        stats["replaced_windows"] += 1
+        # 区间内原有文本段的得分都低于 threshold
+        stats["improved_segments"] += sum(
+            1 for m in new_matches if m["match_score"] >= threshold
+        )
+        words.extend(word_timestamps[cursor:left_word])
+        words.extend(new_words)
+        cursor = right_word
+
+    words.extend(word_timestamps[cursor:])
+    stats["refined_seconds"] = round(stats["refined_seconds"], 3)
+    return words, stats
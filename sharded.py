@@ -0,0 +1,386 @@
+"""
+多进程分片对齐：把一个长文件按文本段与音频切分点分成多片，在多个进程中并行对齐
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from long_audio import locate_segments
+from matching import HIGH_MATCH_SCORE, monotonic_match
+from refine import assign_matches
+from vad import frame_energy_db
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的处理器，由 init_worker 创建，每个进程只加载一次模型
+_worker_processor = None
+
+
+def find_split_point(
+    waveform, sample_rate: int, estimate: float, low: int, high: int, search_sec: float
+):
+    """在估算位置 estimate（秒）前后 search_sec 秒内查找能量最低的帧，返回采样下标
+
+    结果限制在 [low, high] 内。
+    """
+    center = int(estimate * sample_rate)
+    radius = int(search_sec * sample_rate)
+    start = max(low, center - radius)
+    end = min(high, center + radius)
+    if end <= start:
+        return min(max(center, low), high)
+    energy, frame = frame_energy_db(waveform[start:end], sample_rate)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def plan_shards(
+    waveform, sample_rate: int, segments, num_shards: int, search_sec: float = 15.0
+):
+    """规划分片，返回 [(文本段起点, 文本段终点, 采样起点, 采样终点)]
+
+    文本按字符数均分并对齐到文本段边界；音频切分点按累计字符数估算，
+    再移到估算位置附近最安静的位置。估算只决定每片对齐哪些文本，
+    每片的采样区间是该片的归属区间，结果以匹配到的位置为准（见 ShardedAligner.align）。
+    """
+    lengths = np.array([len(segment) for segment in segments], dtype=np.int64)
+    cumulative = np.cumsum(lengths)
+    total_chars = int(cumulative[-1]) if len(cumulative) else 0
+    num_shards = max(1, min(num_shards, len(segments)))
+    if total_chars == 0 or num_shards == 1:
+        return [(0, len(segments), 0, len(waveform))]
+
+    # 每个切分点之后的第一个文本段下标
+    targets = total_chars * np.arange(1, num_shards) / num_shards
+    cuts = np.searchsorted(cumulative, targets) + 1
+    cuts = np.unique(np.clip(cuts, 1, len(segments) - 1))
+
+    duration = len(waveform) / sample_rate
+    shards = []
+    seg_start = 0
+    sample_start = 0
+    for cut in cuts.tolist():
+        estimate = duration * cumulative[cut - 1] / total_chars
+        split = find_split_point(
+            waveform,
+            sample_rate,
+            estimate,
+            sample_start + 1,
+            len(waveform) - 1,
+            search_sec,
+        )
+        shards.append((seg_start, cut, sample_start, split))
+        seg_start = cut
+        sample_start = split
+    shards.append((seg_start, len(segments), sample_start, len(waveform)))
+    return shards
+
+
+def commit_shard(segments, words, punctuation: str, own_start: float, own_end: float):
+    """确定分片中可以提交的文本段，返回与 segments 等长的列表，不可提交的为 None
+
+    单调匹配后，只提交得分不低于 HIGH_MATCH_SCORE、且字词全部落在分片归属区间
+    [own_start, own_end] 内的文本段。文本估算偏差时没有对应音频的文本会被挤到
+    分片音频的两端，落在归属区间之外，不会被提交。
+    """
+    matched = monotonic_match(segments, words, punctuation)
+    committed = [None] * len(segments)
+    for i, match in enumerate(assign_matches(segments, matched, words)):
+        if match is None or match[0] < HIGH_MATCH_SCORE:
+            continue
+        segment_words = words[match[1] : match[2]]
+        if (
+            segment_words[0]["start_time"] >= own_start
+            and segment_words[-1]["end_time"] <= own_end
+        ):
+            committed[i] = segment_words
+    return committed
+
+
+def find_gaps(committed, start_time: float, end_time: float):
+    """查找未提交的连续文本段，返回 [(文本段起点, 文本段终点, 起始秒, 结束秒)]
+
+    committed 对应 [start_time, end_time] 内的文本段。音频区间以两侧已提交文本段的
+    字词为边界；边界之间没有音频时，把相邻的已提交文本段并入该区间重新对齐
+    （原地把 committed 中对应的条目置为 None）。
+    """
+    gaps = []
+    i = 0
+    while i < len(committed):
+        if committed[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(committed) and committed[j] is None:
+            j += 1
+        while True:
+            start = committed[i - 1][-1]["end_time"] if i > 0 else start_time
+            end = committed[j][0]["start_time"] if j < len(committed) else end_time
+            if end > start or (i == 0 and j == len(committed)):
+                break
+            if j < len(committed):
+                committed[j] = None
+                while j < len(committed) and committed[j] is None:
+                    j += 1
+            else:
+                i -= 1
+                committed[i] = None
+                if gaps and gaps[-1][1] == i:
+                    i = gaps.pop()[0]
+        gaps.append((i, j, start, end))
+        i = j
+    return gaps
+
+
+def init_worker(settings):
+    """工作进程初始化：创建处理器并加载一份模型"""
+    global _worker_processor
+    from flexible_processor import FlexibleTextTimestampProcessor
+
+    factory = settings["aligner_factory"]
+    processor = FlexibleTextTimestampProcessor(
+        settings["model_name"], aligner=factory() if factory else None
+    )
+    processor.set_cpu_profile(
+        dtype=settings["dtype"],
+        intra_op_threads=settings["intra_op_threads"],
+        inter_op_threads=settings["inter_op_threads"],
+        quantize=settings["quantize"],
+    )
+    processor.vad = settings["vad"]
+    processor.load_model()
+    _worker_processor = processor
+
+
+def align_shard(source, total_samples, start, end, sample_rate, text, language):
+    """在工作进程中对齐一个分片，时间戳相对于分片起点
+
+    source 为 ("shm", 共享内存名) 或 ("npy", 波形缓存文件路径)，后者以内存映射方式读取。
+    """
+    kind, name = source
+    if kind == "npy":
+        waveform = np.load(name, mmap_mode="r")
+        return _worker_processor.align_words(
+            (waveform[start:end], sample_rate), text, language
+        )
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        waveform = np.ndarray((total_samples,), dtype=np.float32, buffer=shm.buf)
+        words = _worker_processor.align_words(
+            (waveform[start:end], sample_rate), text, language
+        )
+        # 释放对共享内存的引用后才能关闭
+        del waveform
+        return words
+    finally:
+        shm.close()
+
+
+class ShardedAligner:
+    """在多个工作进程中并行对齐同一文件的各个分片
+
+    每个工作进程加载自己的模型；解码后的波形放在共享内存中（来自波形缓存的
+    内存映射数组则直接映射同一文件），工作进程直接读取对应区间，不需要序列化传递。
+    进程池在多次调用之间复用。
+    """
+
+    def __init__(self, settings, workers: int, margin_sec: float = 10.0):
+        self.settings = settings
+        self.workers = workers
+        self.margin_sec = margin_sec
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            # fork 出的子进程继承 PyTorch 线程池状态可能死锁，使用 spawn
+            self.executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.settings,),
+            )
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def align(
+        self,
+        waveform,
+        sample_rate: int,
+        text: str,
+        segments,
+        language: str,
+        punctuation: str,
+        spans=None,
+    ):
+        """分片对齐解码后的波形，返回全局时间轴上的字词时间戳列表
+
+        与长音频分窗对齐相同，结果只在匹配确认后提交，按轮进行：
+        1. 每个待对齐区域按工作进程数切分为若干片并行对齐，每片的音频向两侧
+           各多取 margin_sec 秒（不超出区域）；
+        2. 每片只提交匹配良好、且落在该片归属区间内的文本段（commit_shard）；
+        3. 未提交的文本段（分片边界附近、语速变化导致估算偏差的部分）以两侧已提交的
+           字词为边界组成新的区域（find_gaps），在下一轮重新切分对齐。
+        只需一片的区域整体对齐后直接采用；一轮中没有提交任何文本段、或未提交的
+        文本段合并后覆盖整个区域时，该区域在下一轮整体对齐。其余区域的文本段数
+        每轮严格减少，保证结束。拼接时不修改时间戳，各部分的文本与音频区间都按
+        顺序排列。spans 为分割时记录的文本段字符区间，未提供时在 text 中重新定位。
+        """
+        margin = int(self.margin_sec * sample_rate)
+        if spans is None:
+            spans = locate_segments(text, segments)
+        logger.info(f"分片对齐: {self.workers} 个进程")
+
+        shm = None
+        if isinstance(waveform, np.memmap) and waveform.dtype == np.float32:
+            source = ("npy", waveform.filename)
+        else:
+            waveform = np.asarray(waveform, dtype=np.float32)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, waveform.nbytes))
+            shared = np.ndarray(waveform.shape, dtype=np.float32, buffer=shm.buf)
+            shared[:] = waveform
+            del shared
+            source = ("shm", shm.name)
+
+        try:
+            executor = self.start()
+
+            def submit(seg_start, seg_stop, start, end):
+                """提交一段文本与 [start, end) 采样区间的对齐，返回 (偏移秒数, future)"""
+                return (
+                    start / sample_rate,
+                    executor.submit(
+                        align_shard,
+                        source,
+                        len(waveform),
+                        start,
+                        end,
+                        sample_rate,
+                        text[spans[seg_start][0] : spans[seg_stop - 1][1]],
+                        language,
+                    ),
+                )
+
+            def collect(job):
+                offset, future = job
+                words = future.result()
+                for word in words:
+                    word["start_time"] = round(word["start_time"] + offset, 3)
+                    word["end_time"] = round(word["end_time"] + offset, 3)
+                return words
+
+            # 每个文本段提交的字词；整体对齐的区域按起始文本段保存 (终点, 字词)
+            committed = [None] * len(segments)
+            blocks = {}
+            # 待对齐区域：(文本段起点, 文本段终点, 采样起点, 采样终点, 最多分片数)
+            regions = [(0, len(segments), 0, len(waveform), self.workers)]
+            rounds = 0
+            while regions:
+                rounds += 1
+                planned = []
+                for seg_start, seg_stop, sample_start, sample_end, limit in regions:
+                    # 分片数与区域时长成比例，边界附近的小区域整体对齐
+                    num_shards = min(
+                        limit,
+                        round(
+                            self.workers
+                            * (sample_end - sample_start)
+                            / max(1, len(waveform))
+                        ),
+                    )
+                    shards = plan_shards(
+                        waveform[sample_start:sample_end],
+                        sample_rate,
+                        segments[seg_start:seg_stop],
+                        max(1, num_shards),
+                    )
+                    jobs = []
+                    for a, b, start, end in shards:
+                        a, b = seg_start + a, seg_start + b
+                        start, end = sample_start + start, sample_start + end
+                        jobs.append(
+                            (
+                                (a, b, start, end),
+                                submit(
+                                    a,
+                                    b,
+                                    max(sample_start, start - margin),
+                                    min(sample_end, end + margin),
+                                ),
+                            )
+                        )
+                    planned.append(
+                        ((seg_start, seg_stop, sample_start, sample_end), jobs)
+                    )
+
+                regions = []
+                for (seg_start, seg_stop, sample_start, sample_end), jobs in planned:
+                    if len(jobs) == 1:
+                        blocks[seg_start] = (seg_stop, collect(jobs[0][1]))
+                        continue
+                    region = []
+                    for (a, b, start, end), job in jobs:
+                        region.extend(
+                            commit_shard(
+                                segments[a:b],
+                                collect(job),
+                                punctuation,
+                                start / sample_rate,
+                                end / sample_rate,
+                            )
+                        )
+                    if all(words is None for words in region):
+                        regions.append(
+                            (seg_start, seg_stop, sample_start, sample_end, 1)
+                        )
+                        continue
+                    gaps = find_gaps(
+                        region, sample_start / sample_rate, sample_end / sample_rate
+                    )
+                    committed[seg_start:seg_stop] = region
+                    for i, j, start, end in gaps:
+                        if (i, j) == (0, len(region)):
+                            # 合并后已提交的文本段全部并入同一区间，与本轮相同，下一轮整体对齐
+                            regions.append(
+                                (seg_start, seg_stop, sample_start, sample_end, 1)
+                            )
+                            continue
+                        regions.append(
+                            (
+                                seg_start + i,
+                                seg_start + j,
+                                int(start * sample_rate),
+                                min(math.ceil(end * sample_rate), sample_end),
+                                self.workers,
+                            )
+                        )
+
+            logger.info(f"分片对齐完成: {rounds} 轮，整体对齐 {len(blocks)} 个区域")
+            word_timestamps = []
+            i = 0
+            while i < len(segments):
+                if i in blocks:
+                    i, words = blocks[i]
+                    word_timestamps.extend(words)
+                else:
+                    word_timestamps.extend(committed[i])
+                    i += 1
+            return word_timestamps
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+
+def default_threads_per_worker(workers: int):
+    """平均分配 CPU 核心给各个工作进程"""
+    return max(1, (os.cpu_count() or 1) // workers)
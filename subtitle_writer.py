@@ -0,0 +1,231 @@
+"""
+字幕写出：一次遍历同一份结果写出字词级 SRT、句级 SRT、WebVTT、ASS 与 TSV
+"""
+
+from itertools import count, islice
+
+import numpy as np
+
+# 字幕格式与默认的输出文件后缀
+SUBTITLE_FORMATS = {
+    "word_srt": "_word.srt",
+    "sentence_srt": "_sentence.srt",
+    "vtt": ".vtt",
+    "ass": ".ass",
+    "tsv": ".tsv",
+}
+DEFAULT_SUBTITLE_FORMATS = ("word_srt", "sentence_srt")
+
+# 每次批量写入的行数
+WRITE_CHUNK_ROWS = 65536
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,60,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,40,40,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def to_milliseconds(seconds):
+    """秒数数组四舍五入为整数毫秒，负数按 0 处理"""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    return np.maximum(np.rint(seconds * 1000), 0).astype(np.int64)
+
+
+def put_digits(matrix, column: int, values, width: int):
+    """把整数数组按固定宽度的十进制数字写入字符矩阵的若干列"""
+    for k in range(width):
+        matrix[:, column + k] = values // 10 ** (width - 1 - k) % 10 + ord("0")
+
+
+def format_clock(
+    milliseconds, separator: str = ",", fraction_digits: int = 3, hour_digits: int = 2
+):
+    """把毫秒数组一次格式化为 H:MM:SS<分隔符>小数 形式的字符串列表
+
+    所有时间戳先在 NumPy 中拆分为时、分、秒并写入一个定宽字符矩阵，
+    整体解码后一次切分，不对每个时间戳单独做格式化运算。
+    fraction_digits 小于 3 时四舍五入（ASS 为 2 位，即厘秒）。
+    """
+    milliseconds = np.asarray(milliseconds, dtype=np.int64)
+    if len(milliseconds) == 0:
+        return []
+    unit = 10 ** (3 - fraction_digits)
+    ticks = (milliseconds + unit // 2) // unit
+    per_second = 10**fraction_digits
+    fraction = ticks % per_second
+    total_seconds = ticks // per_second
+    hours = total_seconds // 3600
+
+    # 小时之后的部分定宽：":MM:SS" + 分隔符 + 小数，每行以换行符结尾
+    width = 8 + fraction_digits
+    matrix = np.empty((len(milliseconds), width), dtype=np.uint8)
+    matrix[:, 0] = ord(":")
+    put_digits(matrix, 1, total_seconds // 60 % 60, 2)
+    matrix[:, 3] = ord(":")
+    put_digits(matrix, 4, total_seconds % 60, 2)
+    matrix[:, 6] = ord(separator)
+    put_digits(matrix, 7, fraction, fraction_digits)
+    matrix[:, -1] = ord("\n")
+
+    overflow = hours.max() >= 10**hour_digits
+    if not overflow:
+        hour_matrix = np.empty((len(milliseconds), hour_digits), dtype=np.uint8)
+        put_digits(hour_matrix, 0, hours, hour_digits)
+        matrix = np.hstack([hour_matrix, matrix])
+
+    # 整体解码后按换行符切分，切分在 C 中完成
+    clock = matrix.tobytes().decode("ascii").split("\n")
+    clock.pop()
+    if overflow:
+        # 超过小时字段宽度时只逐个格式化小时
+        return [
+            f"{hour:0{hour_digits}d}{rest}" for hour, rest in zip(hours.tolist(), clock)
+        ]
+    return clock
+
+
+def time_columns(items):
+    """取出字词或文本段的 (起始时间数组, 结束时间数组, 文本列表)"""
+    starts = np.fromiter(
+        (item["start_time"] for item in items), dtype=np.float64, count=len(items)
+    )
+    ends = np.fromiter(
+        (item["end_time"] for item in items), dtype=np.float64, count=len(items)
+    )
+    return starts, ends, [item["text"] for item in items]
+
+
+def vtt_text(text: str):
+    """转义 WebVTT 中的特殊字符，并去掉会提前结束字幕块的空行"""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if "\n" in text:
+        text = "\n".join(line for line in text.splitlines() if line.strip())
+    return text
+
+
+def ass_text(text: str):
+    """ASS 字幕以 \\N 表示换行，花括号会被解析为样式标签"""
+    return (
+        text.replace("{", "(")
+        .replace("}", ")")
+        .replace("\r\n", "\n")
+        .replace("\n", "\\N")
+    )
+
+
+def tsv_text(text: str):
+    return " ".join(text.split()) if ("\t" in text or "\n" in text) else text
+
+
+def srt_rows(starts, ends, texts):
+    return map("{}\n{} --> {}\n{}\n\n".format, count(1), starts, ends, texts)
+
+
+def vtt_rows(starts, ends, texts):
+    return map("{} --> {}\n{}\n\n".format, starts, ends, map(vtt_text, texts))
+
+
+def ass_rows(starts, ends, texts):
+    return map(
+        "Dialogue: 0,{},{},Default,,0,0,0,,{}\n".format,
+        starts,
+        ends,
+        map(ass_text, texts),
+    )
+
+
+def tsv_rows(starts, ends, texts):
+    return map("{}\t{}\t{}\n".format, starts, ends, map(tsv_text, texts))
+
+
+def write_rows(path, header: str, rows):
+    """批量写出：每次拼接 WRITE_CHUNK_ROWS 行后一次写入"""
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES) as f:
+        f.write(header)
+        while True:
+            chunk = "".join(islice(rows, WRITE_CHUNK_ROWS))
+            if not chunk:
+                break
+            f.write(chunk)
+    return path
+
+
+def write_subtitles(outputs, word_timestamps, matched_segments):
+    """一次写出多种格式的字幕文件，返回实际写出的 {格式: 路径}
+
+    outputs 为 {格式: 输出路径}，格式见 SUBTITLE_FORMATS。word_srt 以字词为单位，
+    其他格式以匹配后的文本段为单位；文本为空白的条目不写出。
+    字词与文本段的全部时间戳合并后只转换一次毫秒，各格式所需的时间字符串
+    再分别由 format_clock 一次生成。TSV 的起止时间为整数毫秒。
+    """
+    unknown = set(outputs) - set(SUBTITLE_FORMATS)
+    if unknown:
+        raise ValueError(
+            f"不支持的字幕格式: {', '.join(sorted(unknown))}，"
+            f"可选: {', '.join(SUBTITLE_FORMATS)}"
+        )
+    if not outputs:
+        return {}
+
+    words = [w for w in word_timestamps if w["text"].strip()]
+    segments = [s for s in matched_segments if s["text"].strip()]
+    word_starts, word_ends, word_texts = time_columns(words)
+    seg_starts, seg_ends, seg_texts = time_columns(segments)
+    milliseconds = to_milliseconds(
+        np.concatenate([word_starts, word_ends, seg_starts, seg_ends])
+    )
+    n_words = len(words)
+    n_segments = len(segments)
+
+    def split(clock):
+        """把合并后的时间字符串拆回 (字词起点, 字词终点, 文本段起点, 文本段终点)"""
+        bounds = np.cumsum([0, n_words, n_words, n_segments, n_segments]).tolist()
+        return [clock[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    clocks = {}
+
+    def clock(style):
+        if style not in clocks:
+            separator, fraction_digits, hour_digits = style
+            clocks[style] = split(
+                format_clock(milliseconds, separator, fraction_digits, hour_digits)
+            )
+        return clocks[style]
+
+    written = {}
+    for name, path in outputs.items():
+        if name == "word_srt":
+            starts, ends, _, _ = clock((",", 3, 2))
+            write_rows(path, "", srt_rows(starts, ends, word_texts))
+        elif name == "sentence_srt":
+            _, _, starts, ends = clock((",", 3, 2))
+            write_rows(path, "", srt_rows(starts, ends, seg_texts))
+        elif name == "vtt":
+            _, _, starts, ends = clock((".", 3, 2))
+            write_rows(path, "WEBVTT\n\n", vtt_rows(starts, ends, seg_texts))
+        elif name == "ass":
+            _, _, starts, ends = clock((".", 2, 1))
+            write_rows(path, ASS_HEADER, ass_rows(starts, ends, seg_texts))
+        elif name == "tsv":
+            segment_ms = milliseconds[2 * n_words :]
+            write_rows(
+                path,
+                "start\tend\ttext\n",
+                tsv_rows(
+                    segment_ms[:n_segments].tolist(),
+                    segment_ms[n_segments:].tolist(),
+                    seg_texts,
+                ),
+            )
+        written[name] = path
+    return written
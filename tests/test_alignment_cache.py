@@ -0,0 +1,36 @@
+"""
+对齐缓存键测试：影响对齐结果的推理配置都应反映在缓存键中
+"""
+
+from flexible_processor import FlexibleTextTimestampProcessor
+from stub_aligner import StubForcedAligner
+
+TEXT = "今天天气很好。我们去公园散步。"
+
+
+def make_processor(tmp_path, **profile):
+    processor = FlexibleTextTimestampProcessor(aligner=StubForcedAligner())
+    processor.enable_cache(tmp_path / "cache")
+    processor.set_cpu_profile(**profile)
+    return processor
+
+
+def cache_key(tmp_path, processor):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    return processor.alignment_cache_key(str(audio), TEXT, "Chinese")
+
+
+def test_cache_key_changes_with_dtype(tmp_path):
+    float32 = make_processor(tmp_path, dtype="float32")
+    bfloat16 = make_processor(tmp_path, dtype="bfloat16")
+    assert cache_key(tmp_path, float32) != cache_key(tmp_path, bfloat16)
+
+
+def test_cache_key_uses_resolved_dtype(tmp_path):
+    auto = make_processor(tmp_path, dtype="auto")
+    # 模型加载后 auto 解析为实际使用的精度
+    auto.inference_config = {"dtype": "float32"}
+    float32 = make_processor(tmp_path, dtype="float32")
+    assert cache_key(tmp_path, auto) == cache_key(tmp_path, float32)
+    assert auto.new_job().model_dtype() == "float32"
@@ -0,0 +1,92 @@
+"""
+增量重新对齐测试：音频读取替换为静音，对齐使用桩对齐器
+"""
+
+import numpy as np
+import pytest
+
+import incremental
+from incremental import realign_edits
+from stub_aligner import TOKEN_PATTERN, StubForcedAligner
+
+SEGMENTS = [
+    "今天天气很好。",
+    "我们去公园散步。",
+    "湖边有很多鸭子。",
+    "孩子们在放风筝。",
+    "傍晚开始下雨了。",
+    "大家都回家吃饭。",
+    "晚上看了一部电影。",
+    "然后早早睡觉了。",
+]
+
+
+def previous_result(unmatched):
+    """每个字 1 秒；unmatched 中的文本段换成无关的字，重新匹配时无法匹配"""
+    words = []
+    for i, segment in enumerate(SEGMENTS):
+        tokens = (
+            list("甲乙丙丁戊") if i in unmatched else TOKEN_PATTERN.findall(segment)
+        )
+        for token in tokens:
+            start = float(len(words))
+            words.append({"text": token, "start_time": start, "end_time": start + 0.8})
+    return words
+
+
+@pytest.fixture
+def silent_audio(monkeypatch):
+    monkeypatch.setattr(
+        incremental,
+        "load_audio_window",
+        lambda path, start, duration, sample_rate: np.zeros(
+            int(duration * sample_rate), dtype=np.float32
+        ),
+    )
+    monkeypatch.setattr(incremental, "get_duration", lambda path: 1000.0)
+
+
+def align_fn(audio, text, language):
+    return [
+        {"text": item.text, "start_time": item.start_time, "end_time": item.end_time}
+        for item in StubForcedAligner().align(audio, text, language)[0]
+    ]
+
+
+def run(segments, previous_words, context_segments):
+    return realign_edits(
+        align_fn,
+        "audio.wav",
+        "".join(segments),
+        segments,
+        SEGMENTS,
+        previous_words,
+        "Chinese",
+        "。",
+        context_segments=context_segments,
+    )
+
+
+def tokens(segments):
+    return [token for segment in segments for token in TOKEN_PATTERN.findall(segment)]
+
+
+def test_realign_includes_unmatched_segments_up_to_anchor(silent_audio):
+    segments = SEGMENTS[:4] + ["傍晚突然下起大雨。"] + SEGMENTS[5:]
+    words, stats = run(segments, previous_result({2, 3}), context_segments=1)
+
+    assert [word["text"] for word in words] == tokens(segments)
+    assert stats["realigned_windows"] == 1
+    # 窗口从已匹配的第 2 段结束到第 7 段开始
+    assert stats["realigned_seconds"] == pytest.approx(37 - 12.8)
+
+
+def test_realign_merges_windows_sharing_unmatched_segments(silent_audio):
+    segments = list(SEGMENTS)
+    segments[2] = "湖边有几只白鹅。"
+    segments[4] = "傍晚突然下起大雨。"
+    words, stats = run(segments, previous_result({3}), context_segments=0)
+
+    assert [word["text"] for word in words] == tokens(segments)
+    assert stats["changed_segments"] == 2
+    assert stats["realigned_windows"] == 1
@@ -0,0 +1,41 @@
+"""
+长音频分窗对齐测试：音频读取替换为静音，对齐使用桩对齐器
+"""
+
+import numpy as np
+
+import long_audio
+from long_audio import align_long_audio
+from stub_aligner import StubForcedAligner
+
+
+def test_unmatched_window_commits_first_segment_words_only(monkeypatch):
+    monkeypatch.setattr(long_audio, "get_duration", lambda path: 20.0)
+    monkeypatch.setattr(
+        long_audio,
+        "load_audio_window",
+        lambda path, start, duration, sample_rate: np.zeros(
+            int(duration * sample_rate), dtype=np.float32
+        ),
+    )
+
+    def garbled_align(audio, text, language):
+        # 字数不变但文字全部对不上，任何文本段都无法匹配
+        return [
+            {"text": "无", "start_time": item.start_time, "end_time": item.end_time}
+            for item in StubForcedAligner().align(audio, text, language)[0]
+        ]
+
+    segments = ["今天天气很好。", "我们去公园散步。", "湖边有很多鸭子。"]
+    words = align_long_audio(
+        garbled_align,
+        "audio.wav",
+        "".join(segments),
+        segments,
+        "Chinese",
+        "。",
+        window_sec=10.0,
+        overlap_sec=2.0,
+    )
+    # 每个字只输出一次
+    assert len(words) == sum(len(segment) - 1 for segment in segments)
@@ -0,0 +1,83 @@
+"""
+分片对齐的区域划分与终止测试（使用桩对齐器，不加载模型）
+"""
+
+import numpy as np
+
+from sharded import ShardedAligner, find_gaps
+from stub_aligner import StubAlignItem, StubForcedAligner
+
+SAMPLE_RATE = 100
+
+
+class ShiftedAligner(StubForcedAligner):
+    """所有字词都落在分片音频之前，任何分片都不能提交"""
+
+    def align_one(self, audio, text: str):
+        return [
+            StubAlignItem(item.text, item.start_time - 1000, item.end_time - 1000)
+            for item in super().align_one(audio, text)
+        ]
+
+
+class CollapsedAligner(StubForcedAligner):
+    """所有字词都压缩在分片起点"""
+
+    def align_one(self, audio, text: str):
+        return [
+            StubAlignItem(item.text, 0.0, 0.0)
+            for item in super().align_one(audio, text)
+        ]
+
+
+def make_aligner(factory, workers=3):
+    settings = {
+        "model_name": "stub",
+        "aligner_factory": factory,
+        "dtype": "float32",
+        "intra_op_threads": 1,
+        "inter_op_threads": None,
+        "quantize": False,
+        "vad": None,
+    }
+    return ShardedAligner(settings, workers, margin_sec=5.0)
+
+
+def run_align(factory, segments):
+    text = "".join(segments)
+    waveform = np.zeros(300 * SAMPLE_RATE, dtype=np.float32)
+    aligner = make_aligner(factory)
+    try:
+        return aligner.align(waveform, SAMPLE_RATE, text, segments, "Chinese", "。")
+    finally:
+        aligner.close()
+
+
+def words_at(time):
+    return [{"text": "字", "start_time": time, "end_time": time}]
+
+
+def test_find_gaps_bounds_by_committed_words():
+    committed = [words_at(1.0), None, None, words_at(5.0), None]
+    assert find_gaps(committed, 0.0, 10.0) == [(1, 3, 1.0, 5.0), (4, 5, 5.0, 10.0)]
+
+
+def test_find_gaps_absorbs_every_committed_segment():
+    committed = [None, words_at(0.0), words_at(0.0), None]
+    assert find_gaps(committed, 0.0, 10.0) == [(0, 4, 0.0, 10.0)]
+    assert committed == [None] * 4
+
+
+def test_align_when_no_shard_commits():
+    segments = [f"第{i}句话。" for i in range(30)]
+    words = run_align(ShiftedAligner, segments)
+    assert [word["text"] for word in words] == [
+        token for i in range(30) for token in ("第", str(i), "句", "话")
+    ]
+
+
+def test_align_when_gaps_absorb_whole_region():
+    # 首个文本段没有字词，其后提交的文本段都在时间 0，合并后覆盖整个音频
+    segments = ["——。"] + [f"第{i}句话。" for i in range(30)]
+    words = run_align(CollapsedAligner, segments)
+    assert len(words) == 30 * 4
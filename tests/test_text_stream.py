@@ -0,0 +1,36 @@
+"""
+文本分割测试：文件流式分割与整段分割的结果及字符区间一致
+"""
+
+from flexible_processor import FlexibleTextTimestampProcessor
+from stub_aligner import StubForcedAligner
+from text_stream import iter_file_segments, iter_segments
+
+TEXT = (
+    "  第一句话。第二句|含有竖线！\n\n"
+    + "很长的一段没有标点 " * 40
+    + "结尾。最后没有标点"
+)
+
+
+def test_file_segments_match_iter_segments(tmp_path):
+    path = tmp_path / "text.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    for max_length in (None, 16):
+        expected = list(iter_segments(TEXT, "。！", max_length))
+        assert list(iter_file_segments(path, "。！", max_length, chunk_chars=7)) == (
+            expected
+        )
+
+
+def test_split_text_records_spans(tmp_path):
+    path = tmp_path / "text.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    processor = FlexibleTextTimestampProcessor(aligner=StubForcedAligner())
+    processor.set_max_segment_length(16)
+    text = processor.load_text(path)
+
+    segments = list(processor.split_text(text, processor.text_file_path(path)))
+    spans = processor.segment_spans()
+    assert [text[start:end] for start, end in spans] == segments
+    assert segments == list(processor.new_job().split_text(text))
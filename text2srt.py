@@ -4,10 +4,225 @@
 """
 
 import argparse
+import logging
 import sys
 from pathlib import Path
 
+from aligner_client import DEFAULT_SERVER_URL, remote_process, server_health
+from alignment_cache import AlignmentCache
 from flexible_processor import FlexibleTextTimestampProcessor
+from pipeline import discover_jobs, run_pipeline
+from subtitle_writer import SUBTITLE_FORMATS
+from waveform_cache import WaveformCache
+
+
+def create_processor(args):
+    """根据命令行参数创建处理器"""
+    processor = FlexibleTextTimestampProcessor()
+    processor.set_match_mode(args.match_mode)
+    processor.set_result_format(args.result_format)
+    if args.subtitle_formats is not None:
+        processor.set_subtitle_formats(args.subtitle_formats)
+    processor.set_cpu_profile(
+        dtype=args.dtype,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        quantize=args.quantize_int8,
+    )
+    if args.max_segment_length:
+        processor.set_max_segment_length(args.max_segment_length)
+    if args.long_audio_window:
+        processor.set_long_audio_mode(args.long_audio_window, args.long_audio_overlap)
+    if args.shard_workers:
+        processor.set_shard_mode(args.shard_workers, args.shard_margin)
+    if args.refine:
+        processor.set_refinement(threshold=args.refine_threshold)
+    if args.vad:
+        processor.set_vad(
+            threshold_db=args.vad_threshold,
+            min_silence=args.vad_min_silence,
+            keep_silence=args.vad_keep,
+        )
+    if not args.no_cache:
+        processor.enable_cache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.waveform_cache:
+        processor.enable_waveform_cache(
+            args.waveform_cache_dir, args.waveform_cache_size * 1024 * 1024
+        )
+    if args.work_dir:
+        processor.set_checkpoint_dir(args.work_dir)
+    if not args.quiet and not args.no_progress:
+        processor.set_progress_callback(print_progress)
+    return processor
+
+
+def print_progress(done, total):
+    """在标准错误输出上显示按已处理音频时长计算的进度条"""
+    width = 30
+    ratio = done / total if total > 0 else 1.0
+    filled = int(width * ratio)
+    sys.stderr.write(
+        f"\r对齐进度 [{'#' * filled}{'.' * (width - filled)}] "
+        f"{ratio:6.1%}  {done:.0f}/{total:.0f}s"
+    )
+    if done >= total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def server_unsupported_options(args, health):
+    """常驻服务无法按本次参数处理的选项
+
+    模型精度、量化、线程数与分片进程在服务启动时确定，与服务的配置不同时只能在本进程内处理。
+    """
+    inference = health.get("inference") or {}
+    unsupported = []
+    if args.dtype != "auto" and inference.get("dtype") != args.dtype:
+        unsupported.append("--dtype")
+    if args.quantize_int8 and not inference.get("quantized_linear_layers"):
+        unsupported.append("--quantize-int8")
+    if (
+        args.intra_op_threads
+        and inference.get("intra_op_threads") != args.intra_op_threads
+    ):
+        unsupported.append("--intra-op-threads")
+    if (
+        args.inter_op_threads
+        and inference.get("inter_op_threads") != args.inter_op_threads
+    ):
+        unsupported.append("--inter-op-threads")
+    if args.shard_workers > 1:
+        unsupported.append("--shard-workers")
+    return unsupported
+
+
+def resolve_path(path):
+    """服务与命令行的工作目录可能不同，路径参数转换为绝对路径"""
+    return str(Path(path).resolve()) if path else None
+
+
+def process_remote(args, media_path):
+    """通过常驻对齐服务处理单个文件，输出文件写到当前目录
+
+    影响结果的参数都随任务发送，由服务在该任务的处理器上设置。
+    静音压缩、二次对齐与缓存只在命令行指定时发送，否则为 None，沿用服务启动时的设置。
+    """
+    text_input = args.text
+    if Path(text_input).is_file():
+        text_input = str(Path(text_input).resolve())
+
+    stem = Path(media_path).stem
+    show_progress = not args.quiet and not args.no_progress
+    return remote_process(
+        args.server,
+        progress_callback=print_progress if show_progress else None,
+        media_path=str(Path(media_path).resolve()),
+        text_input=text_input,
+        language=args.language,
+        json_output=str(Path(f"{stem}.json").resolve()),
+        word_srt_output=str(Path(f"{stem}_word.srt").resolve()),
+        sentence_srt_output=str(Path(f"{stem}_sentence.srt").resolve()),
+        match_mode=args.match_mode,
+        result_format=args.result_format,
+        subtitle_formats=args.subtitle_formats,
+        long_audio_window=args.long_audio_window,
+        long_audio_overlap=args.long_audio_overlap,
+        metrics_output=resolve_path(args.metrics_file),
+        previous_result=resolve_path(args.previous_result),
+        max_segment_length=args.max_segment_length,
+        vad=True if args.vad else None,
+        vad_threshold=args.vad_threshold,
+        vad_min_silence=args.vad_min_silence,
+        vad_keep=args.vad_keep,
+        refine=True if args.refine else None,
+        refine_threshold=args.refine_threshold,
+        use_cache=False if args.no_cache else None,
+        waveform_cache=args.waveform_cache,
+        waveform_cache_dir=resolve_path(args.waveform_cache_dir),
+        waveform_cache_size=args.waveform_cache_size * 1024 * 1024,
+        work_dir=resolve_path(args.work_dir),
+    )
+
+
+def read_manifest(manifest_path):
+    """读取批量处理清单，每行为 媒体文件路径<TAB>文本内容或文本文件路径"""
+    items = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            parts = line.split("\t", 1)
+            if len(parts) != 2:
+                print(f"清单第 {line_no} 行格式错误，已跳过: {line}")
+                continue
+            items.append((parts[0].strip(), parts[1].strip()))
+    return items
+
+
+def run_batch(args):
+    """批量处理清单或目录中的所有文件"""
+    if args.input_dir:
+        if not Path(args.input_dir).is_dir():
+            print(f"目录不存在: {args.input_dir}")
+            sys.exit(1)
+        items, missing = discover_jobs(args.input_dir, args.text_dir)
+        for media_path in missing:
+            print(f"未找到对应的文本文件，已跳过: {media_path}")
+    else:
+        if not Path(args.batch).exists():
+            print(f"清单文件不存在: {args.batch}")
+            sys.exit(1)
+        items = read_manifest(args.batch)
+
+    if not items:
+        print("没有可处理的文件")
+        sys.exit(1)
+
+    use_pipeline = bool(args.input_dir or args.pipeline)
+    unsupported = [
+        flag
+        for flag, value in (
+            ("--long-audio-window", args.long_audio_window),
+            ("--work-dir", args.work_dir),
+            ("--previous-result", args.previous_result),
+            ("--shard-workers", args.shard_workers > 1),
+            ("--refine", args.refine and use_pipeline),
+        )
+        if value
+    ]
+    if unsupported:
+        mode = "流水线处理" if use_pipeline else "批量处理"
+        print(f"{mode}不支持以下参数: {', '.join(unsupported)}")
+        sys.exit(1)
+
+    processor = create_processor(args)
+    if use_pipeline:
+        results = run_pipeline(
+            processor,
+            items,
+            language=args.language,
+            output_dir=args.output_dir,
+            decode_workers=args.decode_workers,
+            writer_workers=args.writer_workers,
+            queue_size=args.queue_size,
+        )
+    else:
+        results = processor.process_batch(
+            items,
+            language=args.language,
+            output_dir=args.output_dir,
+            max_batch_size=args.batch_size,
+            max_batch_duration=args.batch_duration,
+        )
+
+    failed = [r for r in results if "error" in r]
+    print(f"\n✅ 成功: {len(results) - len(failed)} 个")
+    if failed:
+        print(f"❌ 失败: {len(failed)} 个")
+        for result in failed:
+            print(f"  - {result['media_path']}: {result['error']}")
+        sys.exit(1)
 
 
 def main():
@@ -19,9 +234,219 @@ def main():
     parser.add_argument(
         "-l", "--language", default="Japanese", help="语言 (默认: Japanese)"
     )
+    parser.add_argument(
+        "--match-mode",
+        choices=["monotonic", "legacy"],
+        default="monotonic",
+        help="匹配算法 (默认: monotonic，legacy 为旧版穷举匹配，可用于对比结果)",
+    )
+    parser.add_argument(
+        "--result-format",
+        choices=["json", "compact", "npz"],
+        default="json",
+        help="结果文件格式 (默认: json；compact 为不重复保存字词的紧凑 JSON，npz 为列式二进制)",
+    )
+    parser.add_argument(
+        "--subtitle-formats",
+        nargs="+",
+        choices=list(SUBTITLE_FORMATS),
+        help="写出的字幕格式，可多选 (默认: word_srt sentence_srt；vtt、ass、tsv 为句级字幕)",
+    )
+    parser.add_argument(
+        "--max-segment-length",
+        type=int,
+        default=0,
+        help="文本段长度上限（字符数），超长的段在空白或逗号处继续切分 (默认: 0，不限制)",
+    )
+    parser.add_argument(
+        "--long-audio-window",
+        type=float,
+        default=0,
+        help="长音频分窗对齐的窗口长度（秒），0 表示整段对齐 (默认: 0)",
+    )
+    parser.add_argument(
+        "--long-audio-overlap",
+        type=float,
+        default=30.0,
+        help="长音频分窗对齐的窗口重叠长度（秒） (默认: 30)",
+    )
+
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=0,
+        help="把单个长文件分片后用多个进程并行对齐，每个进程加载一份模型 (默认: 0，不分片)",
+    )
+    parser.add_argument(
+        "--shard-margin",
+        type=float,
+        default=10.0,
+        help="每个分片向两侧多取的音频长度（秒） (默认: 10)",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help="批量处理清单文件（每行: 媒体文件路径<TAB>文本内容或文本文件路径）",
+    )
+    parser.add_argument(
+        "-d",
+        "--input-dir",
+        help="目录模式：以流水线方式处理目录中所有媒体文件（文本为同名 .txt 文件）",
+    )
+    parser.add_argument(
+        "--text-dir", help="目录模式下文本文件所在目录 (默认: 同媒体目录)"
+    )
+    parser.add_argument("-o", "--output-dir", help="批量处理的输出目录")
+    parser.add_argument(
+        "--batch-size", type=int, default=16, help="每批最多文件数 (默认: 16)"
+    )
+    parser.add_argument(
+        "--batch-duration",
+        type=float,
+        default=600.0,
+        help="每批音频总时长上限（秒） (默认: 600)",
+    )
+
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="清单模式也使用流水线（并行解码与写出，单进程推理）",
+    )
+    parser.add_argument("--decode-workers", type=int, help="流水线解码进程数")
+    parser.add_argument("--writer-workers", type=int, help="流水线写出进程数")
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=4,
+        help="流水线各阶段之间最多积压的文件数 (默认: 4)",
+    )
+    parser.add_argument(
+        "--server",
+        default=DEFAULT_SERVER_URL,
+        help=f"常驻对齐服务地址，服务运行时优先使用 (默认: {DEFAULT_SERVER_URL})",
+    )
+    parser.add_argument(
+        "--no-server", action="store_true", help="不使用常驻服务，始终在本进程内对齐"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="对齐结果缓存目录 (默认: ~/.cache/forced-aligner/alignments)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="对齐结果缓存大小上限（MB） (默认: 1024)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不读取也不写入对齐结果缓存"
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="清空对齐结果缓存与解码波形缓存后退出",
+    )
+    parser.add_argument(
+        "--waveform-cache",
+        action="store_true",
+        help="缓存解码后的波形，同一媒体再次处理时以内存映射方式读取，不再解码",
+    )
+    parser.add_argument(
+        "--waveform-cache-dir",
+        default=None,
+        help="解码波形缓存目录 (默认: ~/.cache/forced-aligner/waveforms)",
+    )
+    parser.add_argument(
+        "--waveform-cache-size",
+        type=int,
+        default=8192,
+        help="解码波形缓存大小上限（MB） (默认: 8192)",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["auto", "float32", "bfloat16"],
+        default="auto",
+        help="模型精度，auto 在 CPU 上按启动测速选择 (默认: auto)",
+    )
+    parser.add_argument("--intra-op-threads", type=int, help="PyTorch 算子内线程数")
+    parser.add_argument("--inter-op-threads", type=int, help="PyTorch 算子间线程数")
+    parser.add_argument(
+        "--quantize-int8",
+        action="store_true",
+        help="对模型的 Linear 层做 int8 动态量化（CPU，使用 float32 加载）",
+    )
+    parser.add_argument(
+        "--vad", action="store_true", help="对齐前压缩长静音段，结果映射回原始时间轴"
+    )
+    parser.add_argument(
+        "--vad-threshold",
+        type=float,
+        default=-35.0,
+        help="静音阈值，相对于较响部分的分贝数 (默认: -35)",
+    )
+    parser.add_argument(
+        "--vad-min-silence",
+        type=float,
+        default=1.0,
+        help="压缩的最短静音时长（秒） (默认: 1.0)",
+    )
+    parser.add_argument(
+        "--vad-keep",
+        type=float,
+        default=0.3,
+        help="每个静音段压缩后保留的时长（秒） (默认: 0.3)",
+    )
+    parser.add_argument(
+        "--previous-result",
+        help="同一媒体上次的结果文件，只重新对齐修改过的文本段",
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="检查点目录：长任务中断后以相同参数重新运行时从最后一个检查点继续"
+        "（配合 --long-audio-window 按窗口保存）",
+    )
+    parser.add_argument("--no-progress", action="store_true", help="不显示对齐进度条")
+    parser.add_argument(
+        "--metrics-file",
+        help="写出分阶段耗时、内存与实时率统计（.prom 为 Prometheus 格式，其他为 JSON 行）",
+    )
+    parser.add_argument(
+        "--refine",
+        action="store_true",
+        help="匹配后对低分或未匹配的文本段所在区间做二次对齐",
+    )
+    parser.add_argument(
+        "--refine-threshold",
+        type=float,
+        default=0.8,
+        help="二次对齐的得分阈值，低于该分数的文本段重新对齐 (默认: 0.8)",
+    )
+    parser.add_argument("--log-level", default="INFO", help="日志级别 (默认: INFO)")
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="只输出警告与错误日志"
+    )
 
     args = parser.parse_args()
 
+    logging.basicConfig(
+        level="WARNING" if args.quiet else args.log_level.upper(),
+        format="%(message)s",
+    )
+
+    if args.clear_cache:
+        removed = AlignmentCache(args.cache_dir).clear()
+        print(f"已清空对齐缓存，共删除 {removed} 个条目")
+        removed = WaveformCache(args.waveform_cache_dir).clear()
+        print(f"已清空波形缓存，共删除 {removed} 个条目")
+        return
+
+    if args.batch or args.input_dir:
+        run_batch(args)
+        return
+
     # 参数验证
     if not args.text:
         print("请提供文本内容或文件路径 (-t)")
@@ -37,30 +462,53 @@ def main():
         print("不能同时指定音频和视频文件")
         sys.exit(1)
 
-    # 创建处理器
-    processor = FlexibleTextTimestampProcessor()
+    media_path = args.video or args.audio
+    if not Path(media_path).exists():
+        print(f"{'视频' if args.video else '音频'}文件不存在: {media_path}")
+        sys.exit(1)
+
+    if args.previous_result and not Path(args.previous_result).exists():
+        print(f"上次的结果文件不存在: {args.previous_result}")
+        sys.exit(1)
 
     try:
         print("开始处理...")
 
-        if args.video:
-            # 处理视频文件
-            if not Path(args.video).exists():
-                print(f"视频文件不存在: {args.video}")
-                sys.exit(1)
+        health = None if args.no_server else server_health(args.server)
+        unsupported = server_unsupported_options(args, health) if health else []
+        if unsupported:
+            print(
+                f"常驻对齐服务不支持以下参数，改为在本进程内处理: {', '.join(unsupported)}"
+            )
 
+        if health and not unsupported:
+            # 常驻服务已加载模型，直接发送任务
+            print(f"使用常驻对齐服务: {args.server}")
+            if not args.no_cache and health.get("cache") is False:
+                print(
+                    "常驻对齐服务未启用对齐缓存（以 --no-cache 启动），本次结果不会缓存"
+                )
+            result = process_remote(args, media_path)
+        elif args.video:
+            # 处理视频文件
             print(f"检测到视频文件: {args.video}")
+            processor = create_processor(args)
             result = processor.process_media_file(
-                media_path=args.video, text_input=args.text
+                media_path=args.video,
+                text_input=args.text,
+                language=args.language,
+                metrics_output=args.metrics_file,
+                previous_result=args.previous_result,
             )
         else:
             # 处理音频文件
-            if not Path(args.audio).exists():
-                print(f"音频文件不存在: {args.audio}")
-                sys.exit(1)
-
+            processor = create_processor(args)
             result = processor.process(
-                text_input=args.text, audio_path=args.audio, language=args.language
+                text_input=args.text,
+                audio_path=args.audio,
+                language=args.language,
+                metrics_output=args.metrics_file,
+                previous_result=args.previous_result,
             )
 
         if result:
@@ -76,6 +524,21 @@ def main():
             print(f"  - 段落数: {stats['total_segments']}")
             print(f"  - 词数: {stats['total_words']}")
             print(f"  - 匹配率: {stats['matched_segments']}/{stats['total_segments']}")
+            performance = stats.get("performance") or {}
+            if "real_time_factor" in performance:
+                print(f"  - 实时率: {performance['real_time_factor']:.1f}x")
+            refine = performance.get("refine")
+            if refine:
+                print(
+                    f"  - 二次对齐: 改进 {refine['improved_segments']}"
+                    f"/{refine['weak_segments']} 个低分文本段"
+                )
+            inference = performance.get("inference")
+            if inference:
+                print(
+                    f"  - 推理配置: {inference['device']} {inference['dtype']}, "
+                    f"线程 {inference['intra_op_threads']}/{inference['inter_op_threads']}"
+                )
         else:
             print("❌ 处理失败")
 
@@ -0,0 +1,153 @@
+"""
+流式文本分割：按标点逐段产生文本段及其在原文中的字符偏移，不构造带分隔符的中间字符串
+"""
+
+import re
+from functools import lru_cache
+
+# 文本段超过长度上限时优先在这些字符之后切开
+SOFT_BREAKS = frozenset(" \t\n　，,、；;：:")
+
+# 流式读取文件时每次读取的字符数
+CHUNK_CHARS = 1024 * 1024
+
+
+@lru_cache(maxsize=32)
+def segment_pattern(punctuation: str):
+    """预编译的分割模式：匹配以标点结尾的一段文本，或末尾没有标点的剩余文本"""
+    p = re.escape(punctuation)
+    return re.compile(f"[^{p}]*[{p}]|[^{p}]+")
+
+
+def strip_end(text: str, start: int, end: int):
+    """去掉区间末尾的空白，返回新的结束位置"""
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def strip_span(text: str, start: int, end: int):
+    """去掉区间两端的空白，返回新的区间"""
+    while start < end and text[start].isspace():
+        start += 1
+    return start, strip_end(text, start, end)
+
+
+def cut_points(text: str, start: int, end: int, max_length: int):
+    """把区间切成长度不超过 max_length 的若干段，返回切分点（含两端）
+
+    在长度上限内最后一个软断点（空白、逗号等）之后切开，没有软断点时按长度硬切。
+    """
+    points = [start]
+    while end - start > max_length:
+        cut = start + max_length
+        for i in range(cut, start, -1):
+            if text[i - 1] in SOFT_BREAKS:
+                cut = i
+                break
+        points.append(cut)
+        start = cut
+    points.append(end)
+    return points
+
+
+def emit_span(
+    text: str,
+    start: int,
+    end: int,
+    max_length=None,
+    base: int = 0,
+    continued: bool = False,
+):
+    """产生区间内去掉首尾空白后的非空文本段 (文本段, 起始偏移, 结束偏移)
+
+    continued 为 True 时 start 是同一文本段中已输出部分之后的切分点，
+    不去掉开头的空白，后续切分点与整段一次切分时一致。
+    """
+    if continued:
+        end = strip_end(text, start, end)
+    else:
+        start, end = strip_span(text, start, end)
+    if end <= start:
+        return
+    if max_length and end - start > max_length:
+        points = cut_points(text, start, end, max_length)
+    else:
+        points = (start, end)
+    for a, b in zip(points, points[1:]):
+        a, b = strip_span(text, a, b)
+        if b > a:
+            yield text[a:b], base + a, base + b
+
+
+def iter_segments(text: str, punctuation: str, max_length: int = None):
+    """按标点逐个产生 (文本段, 起始偏移, 结束偏移)，偏移为在 text 中的字符位置
+
+    与按标点插入分隔符再切分的结果一致（文本段去掉首尾空白、跳过空段），
+    但不复制整段文本，文本中的 “|” 等字符也不会被当作分隔符。
+    max_length 指定时，超长的文本段按 cut_points 的规则继续切分。
+    """
+    if not punctuation:
+        yield from emit_span(text, 0, len(text), max_length)
+        return
+    for match in segment_pattern(punctuation).finditer(text):
+        yield from emit_span(text, match.start(), match.end(), max_length)
+
+
+def iter_file_segments(
+    path,
+    punctuation: str,
+    max_length: int = None,
+    encoding: str = "utf-8",
+    chunk_chars: int = CHUNK_CHARS,
+):
+    """流式读取文本文件并逐个产生 (文本段, 起始偏移, 结束偏移)
+
+    每次读取 chunk_chars 个字符，只保留最后一个不完整的文本段，额外内存与文件大小无关
+    （指定 max_length 时不超过 chunk_chars + max_length 个字符）。
+    结果与对整个文件内容调用 iter_segments 相同，
+    偏移与 open(path, encoding=encoding).read() 得到的字符串一致。
+    """
+    pattern = segment_pattern(punctuation) if punctuation else None
+    tail = ""
+    base = 0
+    # 缓冲区开头是否为一个已部分输出的超长文本段中的切分点
+    continued = False
+    with open(path, "r", encoding=encoding) as f:
+        for chunk in iter(lambda: f.read(chunk_chars), ""):
+            buffer = tail + chunk
+            done = 0
+            if pattern is not None:
+                for match in pattern.finditer(buffer):
+                    # 末尾没有标点的部分可能在下一块中继续
+                    if buffer[match.end() - 1] not in punctuation:
+                        break
+                    yield from emit_span(
+                        buffer, match.start(), match.end(), max_length, base, continued
+                    )
+                    continued = False
+                    done = match.end()
+            if max_length:
+                # 很长的一段没有标点：与整段一次切分的切分点相同，
+                # 只输出在该段去掉末尾空白后的长度下必然切出的部分
+                start = done
+                if not continued:
+                    start, _ = strip_span(buffer, done, len(buffer))
+                end = strip_end(buffer, start, len(buffer))
+                if end - start > max_length:
+                    points = cut_points(buffer, start, end, max_length)
+                    for a, b in zip(points[:-2], points[1:-1]):
+                        yield from emit_span(buffer, a, b, None, base)
+                    done = points[-2]
+                    continued = True
+            tail = buffer[done:]
+            base += done
+
+    if pattern is None:
+        yield from emit_span(tail, 0, len(tail), max_length, base, continued)
+        return
+    for match in pattern.finditer(tail):
+        yield from emit_span(
+            tail, match.start(), match.end(), max_length, base, continued
+        )
+        continued = False
@@ -0,0 +1,118 @@
+"""
+基于能量的语音活动检测：对齐前压缩长静音段，对齐后把时间戳映射回原始时间轴
+"""
+
+import numpy as np
+
+
+class TimeMap:
+    """压缩后音频到原始音频的分段线性时间映射
+
+    压缩后的音频由若干保留片段拼接而成，compressed_starts[i] 与 original_starts[i]
+    分别是第 i 个片段在压缩后与原始音频中的起点（秒）。
+    """
+
+    def __init__(self, compressed_starts, original_starts, removed_seconds: float):
+        self.compressed_starts = np.asarray(compressed_starts, dtype=np.float64)
+        self.original_starts = np.asarray(original_starts, dtype=np.float64)
+        self.removed_seconds = removed_seconds
+
+    def to_original(self, times, side: str = "right"):
+        """把压缩后的时间映射回原始时间
+
+        恰好落在片段边界上的时间，side="right" 时归入后一个片段（用于起始时间），
+        side="left" 时归入前一个片段（用于结束时间）。
+        """
+        times = np.asarray(times, dtype=np.float64)
+        piece = np.searchsorted(self.compressed_starts, times, side=side) - 1
+        piece = np.clip(piece, 0, len(self.compressed_starts) - 1)
+        return self.original_starts[piece] + (times - self.compressed_starts[piece])
+
+    def remap_words(self, word_timestamps):
+        """原地把字词时间戳映射回原始时间轴"""
+        if not word_timestamps:
+            return word_timestamps
+        count = len(word_timestamps)
+        starts = np.fromiter(
+            (w["start_time"] for w in word_timestamps), dtype=np.float64, count=count
+        )
+        ends = np.fromiter(
+            (w["end_time"] for w in word_timestamps), dtype=np.float64, count=count
+        )
+        starts = np.round(self.to_original(starts, side="right"), 3).tolist()
+        ends = np.round(self.to_original(ends, side="left"), 3).tolist()
+        for word, start, end in zip(word_timestamps, starts, ends):
+            word["start_time"] = start
+            word["end_time"] = end
+        return word_timestamps
+
+
+def frame_energy_db(waveform, sample_rate: int, frame_sec: float = 0.02):
+    """按固定帧长计算每帧的 RMS 能量（dB），返回 (能量数组, 帧长采样数)"""
+    frame = max(1, int(sample_rate * frame_sec))
+    num_frames = -(-len(waveform) // frame)
+    padded = np.zeros(num_frames * frame, dtype=np.float32)
+    padded[: len(waveform)] = waveform
+    power = np.mean(np.square(padded.reshape(num_frames, frame)), axis=1)
+    return 10.0 * np.log10(power + 1e-10), frame
+
+
+def find_silences(
+    waveform,
+    sample_rate: int,
+    threshold_db: float = -35.0,
+    min_silence: float = 1.0,
+    frame_sec: float = 0.02,
+):
+    """查找长度不少于 min_silence 秒的静音段，返回 (起点, 终点) 采样下标数组
+
+    能量低于“较响帧能量（95 分位）+ threshold_db”的帧视为静音。
+    """
+    if len(waveform) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    energy, frame = frame_energy_db(waveform, sample_rate, frame_sec)
+    silent = energy < np.percentile(energy, 95) + threshold_db
+
+    # 静音帧连续区间的起止帧下标
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_enough = (ends - starts) * frame >= min_silence * sample_rate
+    spans = np.stack([starts[long_enough], ends[long_enough]], axis=1) * frame
+    return np.minimum(spans, len(waveform))
+
+
+def compress_silences(waveform, sample_rate: int, silences, keep: float = 0.3):
+    """把每个静音段压缩为 keep 秒（两端各保留一半），返回 (压缩后的波形, TimeMap)"""
+    half = int(keep * sample_rate / 2)
+    cut_starts = silences[:, 0] + half
+    cut_ends = silences[:, 1] - half
+    valid = cut_ends > cut_starts
+    cut_starts, cut_ends = cut_starts[valid], cut_ends[valid]
+
+    piece_starts = np.concatenate(([0], cut_ends))
+    piece_ends = np.concatenate((cut_starts, [len(waveform)]))
+    lengths = piece_ends - piece_starts
+    compressed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    compressed = np.concatenate(
+        [waveform[a:b] for a, b in zip(piece_starts.tolist(), piece_ends.tolist())]
+    )
+    time_map = TimeMap(
+        compressed_starts / sample_rate,
+        piece_starts / sample_rate,
+        removed_seconds=float((cut_ends - cut_starts).sum()) / sample_rate,
+    )
+    return compressed, time_map
+
+
+def trim_silence(
+    waveform,
+    sample_rate: int,
+    threshold_db: float = -35.0,
+    min_silence: float = 1.0,
+    keep: float = 0.3,
+):
+    """压缩波形中的长静音段，返回 (压缩后的波形, TimeMap)"""
+    silences = find_silences(waveform, sample_rate, threshold_db, min_silence)
+    return compress_silences(waveform, sample_rate, silences, keep)
@@ -0,0 +1,128 @@
+"""
+解码波形缓存：把重采样后的单声道 float32 波形保存为 .npy，以内存映射方式读取
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from alignment_cache import hash_audio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WAVEFORM_CACHE_DIR = Path(
+    os.environ.get(
+        "ALIGNER_WAVEFORM_CACHE_DIR",
+        Path.home() / ".cache" / "forced-aligner" / "waveforms",
+    )
+)
+DEFAULT_WAVEFORM_CACHE_BYTES = 8 * 1024 * 1024 * 1024
+
+
+class WaveformCache:
+    """按总大小做 LRU 淘汰的解码波形磁盘缓存
+
+    以媒体文件内容的哈希与采样率为键。读取时使用 numpy 内存映射，不复制数据；
+    多个进程读取同一文件时共享操作系统的页缓存，不会各自持有一份波形。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes: int = DEFAULT_WAVEFORM_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_WAVEFORM_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, media_path, sample_rate: int):
+        hasher = hashlib.sha256()
+        hash_audio(str(media_path), hasher)
+        return f"{hasher.hexdigest()}_{sample_rate}"
+
+    def path_for(self, key: str):
+        return self.cache_dir / f"{key}.npy"
+
+    def get(self, key: str):
+        """以只读内存映射方式读取缓存的波形，未命中时返回 None"""
+        path = self.path_for(key)
+        try:
+            waveform = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        # 更新访问时间，供 LRU 淘汰使用；条目可能刚被其他进程淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return waveform
+
+    def put(self, key: str, waveform):
+        """写入波形，并按总大小淘汰最久未使用的条目；超过缓存上限的波形不写入"""
+        waveform = np.asarray(waveform, dtype=np.float32)
+        if waveform.nbytes > self.max_bytes:
+            return
+        path = self.path_for(key)
+        # 临时文件名区分进程与线程，同时写入同一条目时互不覆盖
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, waveform)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+
+    def load(self, media_path, sample_rate: int, decode):
+        """读取缓存的波形，未命中时调用 decode(media_path, sample_rate) 解码并写入缓存
+
+        返回只读的内存映射数组。
+        """
+        key = self.make_key(media_path, sample_rate)
+        waveform = self.get(key)
+        if waveform is not None:
+            logger.info(f"命中波形缓存: {media_path}")
+            return waveform
+        waveform = decode(media_path, sample_rate)
+        self.put(key, waveform)
+        # 重新以内存映射方式打开，释放解码时的私有内存
+        cached = self.get(key)
+        return waveform if cached is None else cached
+
+    def entries(self):
+        """按最近使用时间从旧到新列出缓存文件"""
+        entries = []
+        for path in self.cache_dir.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self, keep=None):
+        """淘汰最久未使用的条目，直到总大小不超过上限（不淘汰 keep）
+
+        其他进程正在映射的文件被删除后，已建立的映射仍然有效。
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空缓存，返回删除的条目数"""
+        removed = 0
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,90 @@
+"""
+字词时间戳的字符偏移索引
+"""
+
+import re
+from array import array
+
+
+def build_clean_pattern(punctuation: str, strip_symbols: bool = False):
+    """构建用于清洗文本的正则（去除标点与空白）
+
+    strip_symbols 为 True 时同时去除所有非文字字符（如《》「」），
+    对齐器输出的字词通常不包含这些符号。
+    """
+    if strip_symbols:
+        return re.compile(f"[{re.escape(punctuation)}\\s]|[^\\w]")
+    return re.compile(f"[{re.escape(punctuation)}\\s]")
+
+
+class WordIndex:
+    """在字词时间戳上预先构建的字符偏移索引
+
+    保存清洗后拼接的字词文本，以及字符偏移与字词下标之间的前缀数组，
+    匹配算法查询候选区间的文本与起止时间时无需再拼接字符串或执行正则。
+    """
+
+    def __init__(self, word_timestamps, punctuation: str, strip_symbols: bool = True):
+        self.punctuation = punctuation
+        self.strip_symbols = strip_symbols
+        pattern = build_clean_pattern(punctuation, strip_symbols)
+
+        # word_offsets[i]：第 i 个字词在 text 中的起始偏移，末尾追加总长度
+        self.word_offsets = array("q")
+        # char_to_word[c]：第 c 个字符所属的字词下标
+        self.char_to_word = array("q")
+        self.start_times = array("d")
+        self.end_times = array("d")
+
+        parts = []
+        offset = 0
+        for i, word in enumerate(word_timestamps):
+            clean = pattern.sub("", word["text"]).lower()
+            parts.append(clean)
+            self.word_offsets.append(offset)
+            self.char_to_word.extend([i] * len(clean))
+            self.start_times.append(word["start_time"])
+            self.end_times.append(word["end_time"])
+            offset += len(clean)
+        self.word_offsets.append(offset)
+
+        self.text = "".join(parts)
+        self.pattern = pattern
+
+    def __len__(self):
+        return len(self.start_times)
+
+    def matches(self, punctuation: str, strip_symbols: bool):
+        """判断索引是否按给定的清洗规则构建"""
+        return self.punctuation == punctuation and self.strip_symbols == strip_symbols
+
+    def clean(self, text: str):
+        """按索引的清洗规则清洗任意文本"""
+        return self.pattern.sub("", text).lower()
+
+    def word_at(self, char_offset: int):
+        """字符偏移所在的字词下标"""
+        if char_offset >= len(self.char_to_word):
+            return len(self) - 1
+        return self.char_to_word[char_offset]
+
+    def char_start(self, word_idx: int):
+        """字词在清洗文本中的起始偏移"""
+        return self.word_offsets[word_idx]
+
+    def char_span(self, start_idx: int, end_idx: int):
+        """字词区间 [start_idx, end_idx) 在清洗文本中的字符区间"""
+        return self.word_offsets[start_idx], self.word_offsets[end_idx]
+
+    def span_text(self, start_idx: int, end_idx: int):
+        """字词区间的清洗后文本"""
+        return self.text[self.word_offsets[start_idx] : self.word_offsets[end_idx]]
+
+    def span_equals(self, start_idx: int, end_idx: int, target: str):
+        """字词区间的清洗后文本是否等于 target（不产生临时字符串）"""
+        begin, end = self.char_span(start_idx, end_idx)
+        return end - begin == len(target) and self.text.startswith(target, begin)
+
+    def span_times(self, start_idx: int, end_idx: int):
+        """字词区间的起止时间"""
+        return self.start_times[start_idx], self.end_times[end_idx - 1]